@@ -0,0 +1,203 @@
+"""
+This module contains the higher-dimensional version of the Circle object from
+geometry.py : a ball of any dimension (a disk in dimension 2, a sphere in
+dimension 3), and batched random chord generators working on NumPy arrays.
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import sys
+import math
+import numpy as np
+from streams import *
+
+### class
+
+class Ball:
+    """
+    This class is designed for a ball of dimension d >= 2, represented by its
+    center (a sequence of d coordinates, the origin by default) and its radius.
+    Chords are generated by batches : a batch of chords is a couple (a, b) of
+    (count, d) arrays holding the two ends of each chord. The random numbers
+    of the i-th chord only depend on i and the Stream, so a batch always gives
+    the same chords whatever the way the run is split.
+    The batches are computed in the given floating point type : float32 halves
+    their size, its chords being the float64 ones up to rounding errors.
+    """
+    def __init__(self, dimension, radius, center = None, name = 0, dtype = np.float64):
+        if dimension < 2:
+            sys.exit("Error while creating Ball object :" \
+            +"dimension must be at least 2 (given dimension is " + str(dimension) + ").")
+        if radius <= 0:
+            sys.exit("Error while creating Ball object :" \
+            +"radius must be stricly positive (given radius " + str(radius) + " is <= 0).")
+
+        if dtype not in (np.float32, np.float64):
+            sys.exit("Error while creating Ball object :" \
+            +"dtype must be numpy.float32 or numpy.float64 (given dtype is " + str(dtype) + ").")
+
+        self.dimension = dimension
+        self.radius = radius
+        self.dtype = dtype
+        self.center = np.zeros(dimension, dtype = dtype) if center is None \
+                      else np.asarray(center, dtype = dtype)
+        if self.center.shape != (dimension,):
+            sys.exit("Error while creating Ball object :" \
+            +"center must have " + str(dimension) + " coordinates.")
+        self.name = name if name else ""
+
+
+    def __str__(self):
+        return self.name + " dimension : " + str(self.dimension) + ", center : " \
+                + str(tuple(self.center.tolist())) + ", radius : " + str(self.radius)
+
+
+    def simplexSideLen(self):
+        """
+        Returns the edge length of a regular simplex inscribed in the current
+        Ball (the side of the equilateral triangle in dimension 2).
+        """
+        d = self.dimension
+        return self.radius*math.sqrt(2*(d + 1)/d)
+
+
+    def squaredThreshold(self):
+        """
+        Returns the squared simplexSideLen, to which the squared chord lengths
+        are compared.
+        """
+        d = self.dimension
+        return self.radius**2*2*(d + 1)/d
+
+
+    def regularSimplex(self):
+        """
+        Returns the d + 1 vertices of a regular simplex inscribed in the current
+        Ball, as a (d + 1, d) array.
+        """
+        d = self.dimension
+        # the centered canonical basis of R^(d+1) is a regular simplex lying in
+        # a hyperplane, which we express in one of its orthonormal bases
+        vertices = np.eye(d + 1) - 1/(d + 1)
+        basis = np.linalg.svd(vertices)[2][:d]
+        vertices = vertices @ basis.T
+        vertices *= self.radius/np.linalg.norm(vertices[0])
+
+        return self.center + vertices
+
+
+    def randomPointsFromSurface(self, first, count, stream, offset = 0):
+        """
+        Returns the randomly generated points from the border of the Ball of the
+        chords first to first + count - 1, using normalDraws(d) draws of the
+        given Stream from offset.
+        """
+        return self.center + self.radius*randomDirections(first, count, self.dimension,
+                                                          stream, offset, self.dtype)
+
+
+    def randomPointsFromVolume(self, first, count, stream, offset = 0):
+        """
+        Returns the randomly generated points from the inside of the Ball of the
+        chords first to first + count - 1, using normalDraws(d) + 1 draws of the
+        given Stream from offset.
+        """
+        d = self.dimension
+        directions = randomDirections(first, count, d, stream, offset, self.dtype)
+        u = stream.uniforms(first, count, 1, offset + normalDraws(d), self.dtype)[:, 0]
+        return self.center + (self.radius*u**(1/d))[:, None]*directions
+
+
+    def randomChords_1(self, first, count, stream):
+        """
+        Returns a batch of chords generated from 2 random points of the border.
+        """
+        return self.randomPointsFromSurface(first, count, stream), \
+               self.randomPointsFromSurface(first, count, stream,
+                                            normalDraws(self.dimension))
+
+
+    def randomChords_2(self, first, count, stream):
+        """
+        Returns a batch of chords generated with the second method : the middle
+        is a random point of a random radius.
+        """
+        d = self.dimension
+        directions = randomDirections(first, count, d, stream, dtype = self.dtype)
+        distances = self.radius*stream.uniforms(first, count, 1, normalDraws(d), self.dtype)[:, 0]
+        return self.chordsOfMiddle(self.center + distances[:, None]*directions,
+                                   first, stream, normalDraws(d) + 1)
+
+
+    def randomChords_3(self, first, count, stream):
+        """
+        Returns a batch of chords generated with the third method : the middle is
+        a random point of the Ball.
+        """
+        return self.chordsOfMiddle(self.randomPointsFromVolume(first, count, stream),
+                                   first, stream, normalDraws(self.dimension) + 1)
+
+
+    def randomChords(self, method, first, count, stream):
+        """
+        Returns the batch of the chords first to first + count - 1 generated
+        with the given method (1, 2 or 3) from the given Stream.
+        """
+        if method not in (1, 2, 3):
+            sys.exit("Unknown chord generation method " + str(method) + ".")
+        return getattr(self, "randomChords_" + str(method))(first, count, stream)
+
+
+    def chordsOfMiddle(self, middles, first, stream, offset = 0):
+        """
+        Returns the chords of the given middle points (a (count, d) array). In
+        dimension > 2 a middle point has a whole hyperplane of chords, so the
+        direction of each chord is chosen at random in it, using normalDraws(d)
+        draws of the given Stream from offset.
+        """
+        offsets = middles - self.center
+        squaredDistances = np.einsum("ij,ij->i", offsets, offsets)
+
+        # random direction, made orthogonal to the center -> middle direction
+        directions = randomDirections(first, len(middles), self.dimension, stream, offset,
+                                      self.dtype)
+        dots = np.einsum("ij,ij->i", directions, offsets)
+        directions -= (dots/np.where(squaredDistances > 0, squaredDistances, 1))[:, None]*offsets
+        with np.errstate(invalid = "ignore"): # NaN if the directions were parallel
+            directions /= np.linalg.norm(directions, axis = 1)[:, None]
+
+        halfLengths = np.sqrt(np.maximum(self.radius**2 - squaredDistances, 0))
+        directions *= halfLengths[:, None]
+
+        return middles + directions, middles - directions
+
+
+### functions
+
+def randomDirections(first, count, dimension, stream, offset = 0, dtype = np.float64):
+    """
+    Returns the random unit vectors of the given dimension of the chords first
+    to first + count - 1, as a (count, dimension) array of the given type.
+    """
+    directions = stream.normals(first, count, dimension, offset, dtype)
+    directions /= np.linalg.norm(directions, axis = 1)[:, None]
+    return directions
+
+
+def chordLengths(chords):
+    """
+    Returns the lengths of a batch of chords.
+    """
+    return np.sqrt(chordSquaredLengths(chords))
+
+
+def chordSquaredLengths(chords):
+    """
+    Returns the squared lengths of a batch of chords.
+    """
+    a, b = chords
+    diff = b - a
+    return np.einsum("ij,ij->i", diff, diff)
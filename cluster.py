@@ -0,0 +1,303 @@
+"""
+This module contains the distributed version of the simulation runner : a
+coordinator splits the chords to generate into chunks, and hands them out to
+workers (possibly on other hosts) which send back their counts. As the random
+stream of a chord only depends on the seed and its index, the results do not
+depend on the number of workers nor on which worker got which chunk.
+
+The protocol is made of JSON objects, one per line, on a TCP connection :
+    coordinator -> worker : {"type": "job", "dimension", "radius", "center", "dtype",
+                             "method", "seed", "bins"}
+    coordinator -> worker : {"type": "chunk", "index", "first", "count"}
+    worker -> coordinator : {"type": "result", "index", "success", "total", "counts"}
+    coordinator -> worker : {"type": "stop"}
+The chunks of a worker which dies (or does not answer in time) are handed out
+again to the other workers.
+
+Usage :
+    python cluster.py coordinator METHOD N [--port PORT] [--dimension D] ...
+    python cluster.py worker HOST PORT
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import sys
+import json
+import time
+import socket
+import secrets
+import argparse
+import threading
+import subprocess
+from collections import deque
+from simulation import *
+
+### global variables
+
+CHUNK_SIZE = 2**20 # number of chords of a chunk
+HOST       = "127.0.0.1"
+TIMEOUT    = 30    # seconds given to a worker for a chunk, besides CHORD_TIME per chord
+CHORD_TIME = 1e-4  # seconds given to a worker per chord (10^4 chords/s at least)
+
+### class
+
+class Coordinator:
+    """
+    This class is designed for the coordinator of a distributed run : it
+    listens on (host, port) (port 0 picks a free one, see address) and merges
+    the results of the workers connecting to it. A worker which does not
+    answer within timeout seconds (by default chunkTimeout(chunkSize)) is
+    dropped and its chunk handed out again, as a host which loses power or
+    network never closes its connections.
+    """
+    def __init__(self, ball, method, n, seed = None, chunkSize = CHUNK_SIZE,
+                 bins = BINS, host = HOST, port = 0, timeout = None):
+        self.ball = ball
+        self.method = method
+        self.seed = seed if seed is not None else secrets.randbits(64)
+        self.bins = bins
+        # seconds given to a worker for a chunk
+        self.timeout = timeout if timeout is not None else chunkTimeout(chunkSize)
+
+        self.pending = deque((index, start, min(chunkSize, n - start))
+                             for index, start in enumerate(range(0, n, chunkSize)))
+        self.chunks = len(self.pending)
+        self.done = set()
+        self.estimator = Estimator()
+        self.histogram = Histogram(bins)
+        self.condition = threading.Condition()
+
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()
+
+
+    def finished(self):
+        """
+        Returns true if the results of all the chunks have been merged.
+        """
+        return len(self.done) == self.chunks
+
+
+    def run(self):
+        """
+        Waits for the workers to process all the chunks and returns the
+        RunSummary of the distributed run.
+        """
+        start = time.perf_counter()
+        threading.Thread(target = self.accept, daemon = True).start()
+        with self.condition:
+            self.condition.wait_for(self.finished)
+        self.server.close()
+
+        return RunSummary(self.ball, self.method, self.estimator, self.histogram,
+                          time.perf_counter() - start, self.seed)
+
+
+    def accept(self):
+        """
+        Accepts the workers connections, each of them being served by its own
+        thread.
+        """
+        while not self.finished():
+            try:
+                connection = self.server.accept()[0]
+            except OSError: # server closed
+                return
+            threading.Thread(target = self.serve, args = (connection,),
+                             daemon = True).start()
+
+
+    def serve(self, connection):
+        """
+        Hands out chunks to a worker until all of them are done. The current
+        chunk is given back to the others if the worker fails.
+        """
+        connection.settimeout(self.timeout)
+        stream = connection.makefile("rw")
+        try:
+            send(stream, {"type": "job", "dimension": self.ball.dimension,
+                          "radius": self.ball.radius, "center": self.ball.center.tolist(),
+                          "dtype": np.dtype(self.ball.dtype).name, "method": self.method,
+                          "seed": self.seed, "bins": self.bins})
+        except OSError:
+            connection.close()
+            return
+
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.finished())
+                if self.finished():
+                    break
+                chunk = self.pending.popleft()
+            index, first, count = chunk
+
+            try:
+                send(stream, {"type": "chunk", "index": index, "first": first,
+                              "count": count})
+                result = receive(stream)
+                if result is None:
+                    raise ConnectionError("worker closed the connection")
+                if not validResult(result, index, count, self.bins):
+                    raise ValueError("invalid result of chunk " + str(index))
+                counts = np.array(result["counts"], dtype = np.int64)
+            except (OSError, ValueError):
+                with self.condition:
+                    self.pending.appendleft(chunk)
+                    self.condition.notify_all()
+                try: # close() alone keeps the socket open while the stream exists
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                connection.close()
+                return
+
+            with self.condition:
+                if index not in self.done:
+                    self.done.add(index)
+                    self.estimator.add(result["success"], result["total"])
+                    self.histogram.counts += counts
+                self.condition.notify_all()
+
+        try:
+            send(stream, {"type": "stop"})
+        except OSError:
+            pass
+        connection.close()
+
+
+### functions
+
+def chunkTimeout(chunkSize):
+    """
+    Returns the default number of seconds given to a worker for a chunk of
+    the given number of chords.
+    """
+    return TIMEOUT + chunkSize*CHORD_TIME
+
+
+def validResult(result, index, count, bins):
+    """
+    Returns True if the given message is the result of the chunk of the given
+    index and number of chords, with a histogram of the given number of bins.
+    """
+    def isCount(value):
+        return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+    return (isinstance(result, dict) and result.get("type") == "result"
+            and result.get("index") == index and result.get("total") == count
+            and isCount(result.get("success")) and result["success"] <= count
+            and isinstance(result.get("counts"), list) and len(result["counts"]) == bins
+            and all(isCount(value) for value in result["counts"])
+            and sum(result["counts"]) == count)
+
+
+def send(stream, message):
+    """
+    Writes a message (a dict) on the given stream.
+    """
+    stream.write(json.dumps(message) + "\n")
+    stream.flush()
+
+
+def receive(stream):
+    """
+    Returns the next message of the given stream, or None if it is closed.
+    """
+    line = stream.readline()
+    return json.loads(line) if line else None
+
+
+def worker(host, port):
+    """
+    Connects to the coordinator listening on (host, port) and processes the
+    chunks it hands out until it says to stop.
+    """
+    with socket.create_connection((host, port)) as connection:
+        stream = connection.makefile("rw")
+        job = receive(stream)
+        ball = Ball(job["dimension"], job["radius"], job["center"],
+                    dtype = np.dtype(job["dtype"]).type)
+
+        message = receive(stream)
+        while message is not None and message["type"] == "chunk":
+            summary = run(ball, job["method"], message["count"], seed = job["seed"],
+                          bins = job["bins"], first = message["first"])
+            send(stream, {"type": "result", "index": message["index"],
+                          "success": summary.estimator.success,
+                          "total": summary.estimator.total,
+                          "counts": summary.histogram.counts.tolist()})
+            message = receive(stream)
+
+
+def startWorkers(address, count):
+    """
+    Starts count worker processes on the current host and returns them.
+    """
+    return [subprocess.Popen([sys.executable, __file__, "worker",
+                              address[0], str(address[1])])
+            for i in range(count)]
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description = "Distributed chord generation.")
+    roles = parser.add_subparsers(dest = "role", required = True)
+
+    coordinator = roles.add_parser("coordinator")
+    coordinator.add_argument("method", type = int, choices = METHODS)
+    coordinator.add_argument("n", type = int)
+    coordinator.add_argument("--host", default = HOST)
+    coordinator.add_argument("--port", type = int, default = 0)
+    coordinator.add_argument("--dimension", type = int, default = 2)
+    coordinator.add_argument("--radius", type = float, default = 300)
+    coordinator.add_argument("--seed", type = int)
+    coordinator.add_argument("--chunk", type = int, default = CHUNK_SIZE)
+    coordinator.add_argument("--timeout", type = float,
+                             help = "seconds given to a worker for a chunk "
+                                    "(default : " + str(TIMEOUT) + " + " + str(CHORD_TIME)
+                                    + " per chord)")
+    coordinator.add_argument("--workers", type = int, default = 0,
+                             help = "number of local workers to start")
+
+    workerParser = roles.add_parser("worker")
+    workerParser.add_argument("host")
+    workerParser.add_argument("port", type = int)
+
+    arguments = parser.parse_args(arguments)
+    if arguments.role == "worker":
+        worker(arguments.host, arguments.port)
+        return
+
+    ball = Ball(arguments.dimension, arguments.radius)
+    job = Coordinator(ball, arguments.method, arguments.n, arguments.seed,
+                      arguments.chunk, host = arguments.host, port = arguments.port,
+                      timeout = arguments.timeout)
+    print("Coordinator listening on", job.address[0], job.address[1],
+          "(seed " + str(job.seed) + ")", file = sys.stderr)
+    workers = startWorkers(job.address, arguments.workers)
+    print(job.run())
+    for process in workers:
+        process.wait()
+
+
+### tests
+
+def clusterTest():
+    ball = Ball(2, 300)
+    job = Coordinator(ball, 1, 10**7, seed = 42, chunkSize = 10**5)
+    workers = startWorkers(job.address, 4)
+    time.sleep(1)
+    workers[0].kill() # its chunk must be handed out again
+    print(job.run())
+    print(run(ball, 1, 10**7, seed = 42, processes = 4)) # same counts
+    for process in workers:
+        process.wait()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(sys.argv[1:])
+    else:
+        clusterTest()
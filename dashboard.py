@@ -0,0 +1,123 @@
+"""
+This module contains convergence dashboards : monitors given to the runner
+(cf simulation.run) which show the running estimates of the methods, with
+their confidence bands and the expected values. They are only fed with
+snapshots at log-spaced numbers of chords, so they cost nearly nothing.
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import sys
+import math
+from simulation import *
+from upemtk import * #credits : Arnaud Carayol, Cyril Nicaud, Carine Pivoteau
+
+### global variables
+
+windowWidth   = 1000
+windowHeight  = 600
+METHOD_COLORS = {1: "red", 2: "forest green", 3: "blue"}
+
+### class
+
+class TextDashboard:
+    """
+    This class is designed for a headless dashboard, writing one line per
+    snapshot on the given file (the standard output by default).
+    """
+    def __init__(self, file = None):
+        self.file = file if file is not None else sys.stdout
+
+
+    def snapshot(self, ball, method, estimator):
+        """
+        Writes the current estimate of the given method.
+        """
+        print("method " + str(method) + " : n = " + str(estimator.total).rjust(13)
+              + ", p = " + format(estimator.ratio(), ".6f")
+              + " +- " + format(estimator.halfWidth(), ".6f")
+              + " (expected " + format(analyticProbability(method, ball.dimension), ".6f") + ")",
+              file = self.file)
+
+
+class CanvasDashboard:
+    """
+    This class is designed for a dashboard drawn in the rectangle of upper left
+    corner (x, y) of the upemtk window : the estimates are drawn against the
+    number of chords (log scale, up to maxCount) between the thin grey bounds of
+    their 95% confidence bands, the expected values being the thin lines of the
+    color of each method. Each snapshot only draws the new pieces of the curves.
+    """
+    def __init__(self, maxCount, x = 0, y = 0, width = windowWidth, height = windowHeight,
+                 dimension = 2):
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.decades = max(1, math.log10(maxCount))
+        self.last = {} # last drawn (n, p, low, high) of each method
+
+        rectangle(x, y, x + width, y + height, couleur = "grey77")
+        for decade in range(math.floor(self.decades) + 1):
+            abscissa = self.abscissa(10**decade)
+            ligne(abscissa, y + height - 5, abscissa, y + height, couleur = "grey50")
+            texte(abscissa + 2, y + height - 16, "1e" + str(decade), taille = 8)
+        for method in METHODS:
+            ordinate = self.ordinate(analyticProbability(method, dimension))
+            ligne(x, ordinate, x + width, ordinate, couleur = METHOD_COLORS[method])
+            texte(x + 2, ordinate - 14, "method " + str(method),
+                  couleur = METHOD_COLORS[method], taille = 8)
+        mise_a_jour()
+
+
+    def snapshot(self, ball, method, estimator):
+        """
+        Draws the new piece of the curve of the given method.
+        """
+        low, high = estimator.confidenceInterval()
+        current = (estimator.total, estimator.ratio(), low, high)
+        previous = self.last.get(method, current)
+        self.last[method] = current
+
+        x0, x1 = self.abscissa(previous[0]), self.abscissa(current[0])
+        color = METHOD_COLORS[method]
+        for bound in (2, 3):
+            ligne(x0, self.ordinate(previous[bound]), x1, self.ordinate(current[bound]),
+                  couleur = "grey60")
+        ligne(x0, self.ordinate(previous[1]), x1, self.ordinate(current[1]),
+              couleur = color, epaisseur = 2)
+        mise_a_jour()
+
+
+    def abscissa(self, n):
+        """
+        Returns the abscissa of the given number of chords.
+        """
+        return self.x + self.width*math.log10(max(n, 1))/self.decades
+
+
+    def ordinate(self, p):
+        """
+        Returns the ordinate of the given probability.
+        """
+        return self.y + self.height*(1 - p)
+
+
+### tests
+
+def dashboardTest(n = 10**7):
+    ball = Ball(2, 300)
+    for method in METHODS:
+        print(run(ball, method, n, monitor = TextDashboard()))
+
+    cree_fenetre(windowWidth, windowHeight)
+    dashboard = CanvasDashboard(n)
+    for method in METHODS:
+        run(ball, method, n, monitor = dashboard)
+    attend_ev()
+    ferme_fenetre()
+
+
+if __name__ == "__main__":
+    dashboardTest()
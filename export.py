@@ -0,0 +1,338 @@
+"""
+This module contains a vector exporter (SVG or PDF) of the chords of a circle,
+with its inscribed triangle. The chords are written as they are generated, so
+nothing grows with the run but the file, which is itself bounded : at most
+maxChords chords are written, each one standing for the chords it replaces
+with the opacity of all of them drawn on top of each other.
+
+Usage : python export.py FILE.svg|FILE.pdf [METHOD] [N]
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import os
+import sys
+import time
+import numpy as np
+from simulation import *
+
+### global variables
+
+windowWidth  = 1000
+windowHeight = 1000
+MAX_CHORDS   = 20000 # maximal number of written chords
+OPACITY      = 0.05  # opacity of a chord
+COLORS       = {"long": (135, 206, 235), "short": (255, 165, 0), # sky blue, orange
+                "shape": (0, 0, 0), "triangle": (196, 196, 196)}
+
+### class
+
+class SvgWriter:
+    """
+    This class is designed for the drawing instructions of an SVG file.
+    """
+    def __init__(self, file, width, height):
+        self.file = file
+        self.file.write('<svg xmlns="http://www.w3.org/2000/svg" width="' + str(width)
+                        + '" height="' + str(height) + '" viewBox="0 0 ' + str(width)
+                        + ' ' + str(height) + '">\n<style>path{fill:none;stroke-width:1}'
+                        + ''.join('.' + name + '{stroke:' + svgColor(color) + '}'
+                                  for name, color in COLORS.items())
+                        + '</style>\n<rect width="100%" height="100%" fill="white"/>\n')
+
+
+    def chords(self, ends, classes, opacity):
+        """
+        Writes the segments of the given (count, 4) array of ends, with the
+        given list of color names.
+        """
+        self.file.write('<g stroke-opacity="' + format(opacity, ".4g") + '">\n')
+        self.file.writelines('<path class="' + name + '" d="M' + format(ax, ".1f") + " "
+                             + format(ay, ".1f") + "L" + format(bx, ".1f") + " "
+                             + format(by, ".1f") + '"/>\n'
+                             for (ax, ay, bx, by), name in zip(ends.tolist(), classes))
+        self.file.write('</g>\n')
+
+
+    def circle(self, x, y, radius, name):
+        self.file.write('<circle cx="' + str(x) + '" cy="' + str(y) + '" r="' + str(radius)
+                        + '" fill="none" stroke="' + svgColor(COLORS[name]) + '"/>\n')
+
+
+    def polygon(self, points, name):
+        self.file.write('<polygon points="' + " ".join(str(x) + "," + str(y) for x, y in points)
+                        + '" fill="none" stroke="' + svgColor(COLORS[name]) + '"/>\n')
+
+
+    def close(self):
+        self.file.write('</svg>\n')
+
+
+class PdfWriter:
+    """
+    This class is designed for the drawing instructions of a one page PDF
+    file. The content stream is written as the drawing goes, the objects
+    depending on its end (its length, the opacities) being written after it.
+    """
+    def __init__(self, file, width, height):
+        self.file = file
+        self.width, self.height = width, height
+        self.offsets = {} # position of each object in the file
+        self.states = {}  # name of the graphics state of each opacity
+        self.written = 0
+        self.write("%PDF-1.4\n")
+        self.startObject(4)
+        self.write("<< /Length 5 0 R >>\nstream\n")
+        self.streamStart = self.written
+        # y axis going down, as in the window
+        self.write("1 0 0 -1 0 " + str(height) + " cm 1 w\n")
+
+
+    def write(self, text):
+        data = text.encode("latin-1")
+        self.file.write(data)
+        self.written += len(data)
+
+
+    def startObject(self, number):
+        self.offsets[number] = self.written
+        self.write(str(number) + " 0 obj\n")
+
+
+    def state(self, opacity):
+        """
+        Returns the name of the graphics state of the given stroke opacity.
+        """
+        if opacity not in self.states:
+            self.states[opacity] = "/G" + str(len(self.states))
+        return self.states[opacity]
+
+
+    def chords(self, ends, classes, opacity):
+        """
+        Writes the segments of the given (count, 4) array of ends, with the
+        given list of color names.
+        """
+        lines = [self.state(opacity) + " gs"]
+        current = None
+        for (ax, ay, bx, by), name in zip(ends.tolist(), classes):
+            if name != current:
+                lines.append(pdfColor(COLORS[name]) + " RG")
+                current = name
+            # a segment per path, so that the overlapping segments add up
+            lines.append(format(ax, ".1f") + " " + format(ay, ".1f") + " m "
+                         + format(bx, ".1f") + " " + format(by, ".1f") + " l S")
+        self.write("\n".join(lines) + "\n")
+
+
+    def circle(self, x, y, radius, name):
+        # 4 Bezier curves, k being the distance of their control points
+        k = 0.5523*radius
+        self.write(self.state(1) + " gs " + pdfColor(COLORS[name]) + " RG "
+                   + " ".join(map(str, (x + radius, y))) + " m "
+                   + " ".join(map(str, (x + radius, y + k, x + k, y + radius, x, y + radius))) + " c "
+                   + " ".join(map(str, (x - k, y + radius, x - radius, y + k, x - radius, y))) + " c "
+                   + " ".join(map(str, (x - radius, y - k, x - k, y - radius, x, y - radius))) + " c "
+                   + " ".join(map(str, (x + k, y - radius, x + radius, y - k, x + radius, y))) + " c S\n")
+
+
+    def polygon(self, points, name):
+        self.write(self.state(1) + " gs " + pdfColor(COLORS[name]) + " RG "
+                   + str(points[0][0]) + " " + str(points[0][1]) + " m "
+                   + "".join(str(x) + " " + str(y) + " l " for x, y in points[1:]) + "h S\n")
+
+
+    def close(self):
+        length = self.written - self.streamStart
+        self.write("endstream\nendobj\n")
+        self.startObject(5)
+        self.write(str(length) + "\nendobj\n")
+        for opacity, name in self.states.items():
+            number = 6 + int(name[2:])
+            self.startObject(number)
+            self.write("<< /Type /ExtGState /CA " + format(opacity, ".4g") + " >>\nendobj\n")
+        self.startObject(3)
+        self.write("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 " + str(self.width) + " "
+                   + str(self.height) + "] /Contents 4 0 R /Resources << /ExtGState << "
+                   + " ".join(name + " " + str(6 + int(name[2:])) + " 0 R"
+                              for name in self.states.values()) + " >> >> >>\nendobj\n")
+        self.startObject(2)
+        self.write("<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n")
+        self.startObject(1)
+        self.write("<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+
+        size = max(self.offsets) + 1
+        xref = self.written
+        self.write("xref\n0 " + str(size) + "\n0000000000 65535 f \n"
+                   + "".join(format(self.offsets[number], "010d") + " 00000 n \n"
+                             for number in range(1, size)))
+        self.write("trailer\n<< /Size " + str(size) + " /Root 1 0 R >>\nstartxref\n"
+                   + str(xref) + "\n%%EOF\n")
+
+
+class ChordExport:
+    """
+    This class is designed for the vector export of 2D chords in a file of the
+    given path (SVG or PDF according to its extension). The chords longer than
+    threshold are sky blue, the others orange, like in geometry.py.
+
+    If the number of chords to come (count) is known, one chord out of
+    count/maxChords is written at once, with the opacity of count/maxChords
+    chords of opacity OPACITY drawn on top of each other (more than count
+    chords raise ValueError). Otherwise the chords are sampled in a Reservoir
+    of maxChords chords, written at close.
+    If no chord is dropped (at most maxChords of them), they are all written
+    as they are, opaque.
+    The circle and the triangle are written at close, above the chords.
+    """
+    def __init__(self, path, threshold, count = None, maxChords = MAX_CHORDS,
+                 width = windowWidth, height = windowHeight, opacity = OPACITY, seed = None):
+        if not path.endswith((".svg", ".pdf")):
+            sys.exit("Unknown vector format of " + path + " (.svg or .pdf expected).")
+        self.file = open(path, "w" if path.endswith(".svg") else "wb")
+        self.writer = (SvgWriter if path.endswith(".svg") else PdfWriter)(self.file, width, height)
+        self.threshold = threshold
+        self.count = count
+        self.maxChords = maxChords
+        self.opacity = opacity
+        self.seen = 0    # number of given chords
+        self.written = 0 # number of written chords
+        self.shapes = []
+        self.reservoir = Reservoir(maxChords, seed) if count is None else None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exception):
+        self.close()
+        return False
+
+
+    def add(self, chords):
+        """
+        Gives a batch of chords (a couple (a, b) of (count, 2) arrays) to the
+        exporter.
+        """
+        a, b = chords
+        if self.reservoir is not None:
+            self.reservoir.add(chords)
+            self.seen += len(a)
+            return
+        if self.seen + len(a) > self.count:
+            # else the written chords would outgrow maxChords
+            raise ValueError("more chords than the " + str(self.count) + " announced")
+
+        # the chords i for which floor(i*maxChords/count) changes
+        numbers = np.arange(self.seen, self.seen + len(a))
+        kept = (numbers + 1)*self.maxChords//self.count > numbers*self.maxChords//self.count \
+               if self.count > self.maxChords else np.ones(len(a), dtype = bool)
+        self.seen += len(a)
+        self.write(a[kept], b[kept], self.count)
+
+
+    def addLines(self, lines):
+        """
+        Gives a list of Line objects (cf geometry.py) to the exporter.
+        """
+        a = np.array([(line.a.x, line.a.y) for line in lines], dtype = float).reshape(-1, 2)
+        b = np.array([(line.b.x, line.b.y) for line in lines], dtype = float).reshape(-1, 2)
+        self.add((a, b))
+
+
+    def addCircle(self, circle):
+        """
+        Writes a Circle object (cf geometry.py), at close.
+        """
+        self.shapes.append(("circle", (circle.center.x, circle.center.y, circle.radius)))
+
+
+    def addTriangle(self, triangle):
+        """
+        Writes a Triangle object (cf geometry.py), at close.
+        """
+        self.shapes.append(("polygon", [(point.x, point.y)
+                                        for point in (triangle.a, triangle.b, triangle.c)]))
+
+
+    def addBall(self, ball):
+        """
+        Writes the circle of a Ball of dimension 2 and its inscribed triangle,
+        at close.
+        """
+        x, y = ball.center.tolist()
+        self.shapes.append(("circle", (x, y, ball.radius)))
+        self.shapes.append(("polygon", [tuple(vertex) for vertex in ball.regularSimplex().tolist()]))
+
+
+    def write(self, a, b, total):
+        """
+        Writes the given chords, each one standing for total/maxChords chords
+        (opaque if total is at most maxChords).
+        """
+        if not len(a):
+            return
+        ends = np.hstack((a, b))
+        diff = b - a
+        longer = np.einsum("ij,ij->i", diff, diff) > self.threshold**2
+        classes = np.where(longer, "long", "short").tolist()
+        # opacity of total/maxChords chords drawn on top of each other
+        opacity = 1 - (1 - self.opacity)**(total/self.maxChords) \
+                  if total > self.maxChords else 1
+        self.writer.chords(ends, classes, round(opacity, 4))
+        self.written += len(a)
+
+
+    def close(self):
+        """
+        Writes the sampled chords and the shapes, and closes the file.
+        """
+        if self.reservoir is not None:
+            self.write(*self.reservoir.chords(), self.seen)
+        for kind, shape in self.shapes:
+            if kind == "circle":
+                self.writer.circle(*shape, "shape")
+            else:
+                self.writer.polygon(shape, "triangle")
+        self.writer.close()
+        self.file.close()
+
+
+### functions
+
+def svgColor(color):
+    """
+    Returns the SVG notation of an (r, g, b) color.
+    """
+    return "#" + "".join(format(channel, "02x") for channel in color)
+
+
+def pdfColor(color):
+    """
+    Returns the PDF notation of an (r, g, b) color.
+    """
+    return " ".join(format(channel/255, ".3g") for channel in color)
+
+
+### tests
+
+def exportTest(path = "chords.svg", method = 1, n = 10**7):
+    ball = Ball(2, 300, (windowWidth/2, windowHeight/2))
+    stream = Stream()
+    for count in (n, None):
+        start = time.perf_counter()
+        with ChordExport(path, ball.simplexSideLen(), count) as export:
+            export.addBall(ball)
+            for first, chords in chordBatches(ball, method, stream, 0, n):
+                export.add(chords)
+        print(export.written, "chords of", export.seen, "written in", path,
+              "(" + ("known" if count else "unknown") + " count) :",
+              os.path.getsize(path), "bytes,", time.perf_counter() - start, "s")
+
+
+if __name__ == "__main__":
+    exportTest(*(sys.argv[1:2] + [int(argument) for argument in sys.argv[2:4]]))
@@ -12,6 +12,8 @@ import sys
 import math
 import random
 import time
+import contextlib
+from profiling import *
 from upemtk import * #credits : Arnaud Carayol, Cyril Nicaud, Carine Pivoteau
 
 ### global variables
@@ -19,6 +21,9 @@ from upemtk import * #credits : Arnaud Carayol, Cyril Nicaud, Carine Pivoteau
 windowWidth  = 1000
 windowHeight = 1000
 INFTY        = 2**1000
+SQRT_3       = math.sqrt(3)
+COS_120      = math.cos(math.radians(120))
+SIN_120      = math.sin(math.radians(120))
 
 ### class
 
@@ -104,7 +109,8 @@ class Triangle:
 class Circle:
     """
     This class is designed for a circle, represented by its center (which must
-    be a Point object) and its radius.
+    be a Point object) and its radius. The quantities derived from them are
+    cached (cf invariants).
     """
     def __init__(self, center, radius, name = 0):
         if radius <= 0:
@@ -114,6 +120,8 @@ class Circle:
         self.center = center #must be a Point
         self.radius = radius
         self.name = name if name else ""
+        self.cacheKey = None # (x, y, radius) of the cached invariants
+        self.cache = None
 
     def __str__(self):
         return self.name + " center : " + self.center.__str__() + ", radius : " + str(self.radius)
@@ -157,12 +165,11 @@ class Circle:
         """
         Returns a randomly generated point from the inside of the Circle.
         """
-        p = randomPoint(self.center.x - self.radius, self.center.x + self.radius, \
-                        self.center.y - self.radius, self.center.y + self.radius)
+        xMin, yMin, xMax, yMax = self.boundingBox()
+        p = randomPoint(xMin, xMax, yMin, yMax)
 
         while not self.contains(p):
-            p = randomPoint(self.center.x - self.radius, self.center.x + self.radius, \
-                            self.center.y - self.radius, self.center.y + self.radius)
+            p = randomPoint(xMin, xMax, yMin, yMax)
         return p
 
     def randomRadius(self):
@@ -176,13 +183,59 @@ class Circle:
         """
         Returns an equilateral triangle inscribed in the current circle.
         """
-        a = Point(self.center.x + self.radius, self.center.y)
-        b = Point(self.center.x + math.cos(math.radians(120))*self.radius, \
-         self.center.y + math.sin(math.radians(120))*self.radius)
-        c = Point(self.center.x + math.cos(math.radians(-120))*self.radius, \
-         self.center.y + math.sin(math.radians(-120))*self.radius)
+        a, b, c = self.invariants()["triangle"]
+        return Triangle(Point(*a), Point(*b), Point(*c))
 
-        return Triangle(a, b, c)
+
+    def invariants(self):
+        """
+        Returns the dict of the quantities derived from the center and the
+        radius : the side of the inscribed equilateral triangle and its square
+        (the threshold of the chords), the bounding box, the vertices of the
+        triangle and the vertical radius with its slope. They are computed
+        again only when the center or the radius have changed.
+        """
+        key = (self.center.x, self.center.y, self.radius)
+        if key != self.cacheKey:
+            x, y, r = key
+            verticalRadius = Line(Point(x, y), Point(x, y + r))
+            self.cache = {"sideLen": r*SQRT_3, "squaredThreshold": 3*r*r,
+                          "boundingBox": (x - r, y - r, x + r, y + r),
+                          "triangle": ((x + r, y), (x + COS_120*r, y + SIN_120*r),
+                                       (x + COS_120*r, y - SIN_120*r)),
+                          "verticalRadius": verticalRadius,
+                          "verticalSlope": verticalRadius.slope()}
+            self.cacheKey = key
+        return self.cache
+
+
+    def sideLen(self):
+        """
+        Returns the side length of the inscribed equilateral triangle.
+        """
+        return self.invariants()["sideLen"]
+
+
+    def squaredThreshold(self):
+        """
+        Returns the squared side length of the inscribed equilateral triangle.
+        """
+        return self.invariants()["squaredThreshold"]
+
+
+    def boundingBox(self):
+        """
+        Returns the (xMin, yMin, xMax, yMax) bounding box of the Circle.
+        """
+        return self.invariants()["boundingBox"]
+
+
+    def longerThanSide(self, chord):
+        """
+        Returns true if the given Line is longer than the side of the inscribed
+        equilateral triangle.
+        """
+        return chord.squaredLength() > self.squaredThreshold()
 
 
     def randomChord_1(self):
@@ -245,10 +298,10 @@ class Circle:
 
 
         tmpLine = Line(self.center, middlePoint)
-        radius = self.verticalRadius()
+        radius = self.invariants()["verticalRadius"]
 
         s1 = tmpLine.slope()
-        s2 = radius.slope()
+        s2 = self.invariants()["verticalSlope"]
 
         # finding theta angle between tmpLine and vertical axis
         tanTheta = (s1 - s2)/(1 + s1*s2)
@@ -304,6 +357,13 @@ class Line:
         return math.sqrt((self.b.x - self.a.x)**2 + (self.b.y - self.a.y)**2);
 
 
+    def squaredLength(self):
+        """
+        Returns the squared length of the Line (no square root).
+        """
+        return (self.b.x - self.a.x)**2 + (self.b.y - self.a.y)**2
+
+
     def longerThan(self, line):
         """
         Returns true if the current Line is longer than an other specified Line.
@@ -376,8 +436,10 @@ def upperLeftPoint(points):
 
 ### tests
 
-def geometryTest():
-    random.seed(time.time()) # initialising random seed
+def geometryTest(seed = None, profile = False):
+    seed = seed if seed is not None else time.time_ns()
+    random.seed(seed) # initialising random seed, print it to replay the run
+    print("seed =", seed)
 
     # initializing objects
     A = Point(windowWidth/2, windowHeight/2, "A")
@@ -396,13 +458,14 @@ def geometryTest():
     equi = circle.equilateralTriangle()
     #print(equi)
 
-    # display
+    # display : the circle, the triangle and the center are drawn once in a
+    # static layer, under the chords layer which can be cleared on its own
     cree_fenetre(windowWidth, windowHeight)
     # A.draw()
     # B.draw()
     # C.draw()
-    circle.draw()
-    equi.draw()
+    calque_statique("fond", lambda: (circle.draw(), equi.draw(), A.draw()))
+    calque("cordes")
 
     # tests starts here
     # test = circle.chordFrom(circle.center, 0)
@@ -412,34 +475,33 @@ def geometryTest():
     # remove when finished
 
     n = 60 #number of chords in the circle
-    chordList        = []
-    randomPointsList = []
 
     success = 0 # number of chords that are > to equi side length
 
-    A.draw()
-
     mise_a_jour()
 
     print("Generating chords, please wait...")
 
-    for i in range (n):
-        chordList.append(circle.randomChord_2())
-        currentChord = chordList[i]
-        if(currentChord.length() > equi.sideLen()):
-            currentChord.draw("sky blue")
-            success += 1
-        else:
-            currentChord.draw("orange")
-        print("p =", success/(i + 1))
-
-
-    A.draw()
-    circle.draw()
+    # memory of the Point, Line and canvas items of the chords (cf profiling.py)
+    memory = MemoryProfile() if profile else None
+    with memory if memory is not None else contextlib.nullcontext():
+        for i in range (n):
+            currentChord = circle.randomChord_2() # counted and drawn, not kept
+            if(circle.longerThanSide(currentChord)):
+                currentChord.draw("sky blue")
+                success += 1
+            else:
+                currentChord.draw("orange")
+            if (i + 1) & i == 0 or i + 1 == n: # only after 1, 2, 4, 8... chords
+                print("p =", success/(i + 1))
+    if memory is not None:
+        memory.setChords(n)
+        print(memory)
 
     print("END.")
     attend_ev()
     ferme_fenetre()
 
 
-geometryTest()
\ No newline at end of file
+if __name__ == "__main__":
+    geometryTest()
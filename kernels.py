@@ -0,0 +1,224 @@
+"""
+This module contains the chord kernels : loops generating, classifying and
+counting the chords one by one, which give the same chords as the batched
+generators of ball.py. They are compiled with Numba when it is installed
+(the "numba" backend), otherwise the runner keeps the NumPy batches (the
+"numpy" backend). The "python" backend runs the same loops without
+compiling them, as a reference.
+
+Usage : python kernels.py (benchmark of the backends)
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import sys
+import math
+import types
+import numpy as np
+from streams import *
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+### global variables
+
+BACKENDS = ("numba", "numpy", "python")
+BACKEND  = "numba" if NUMBA_AVAILABLE else "numpy" # backend used by default
+
+__compiled = None # Numba version of countKernel, compiled at first use
+
+### kernels
+
+def uniform(key, index, draw):
+    """
+    Returns the uniform number of the given draw for the chord of the given
+    index, in the stream of the given key (same as Stream.uniform).
+    """
+    row = mix((index*GAMMA + key) & MASK)
+    bits = mix((row + (draw + 1)*GAMMA) & MASK)
+    return ((bits >> 11) + 0.5)*2.**-53
+
+
+def direction(key, index, offset, pairs, out):
+    """
+    Writes in out the random unit vector drawn for the chord of the given
+    index from the draw offset (same as ball.randomDirections).
+    """
+    d = len(out)
+    for j in range(pairs):
+        radius = math.sqrt(-2*math.log(uniform(key, index, offset + j)))
+        angle = 2*math.pi*uniform(key, index, offset + pairs + j)
+        out[j] = radius*math.cos(angle)
+        if pairs + j < d:
+            out[pairs + j] = radius*math.sin(angle)
+    norm = 0.
+    for j in range(d):
+        norm += out[j]*out[j]
+    norm = math.sqrt(norm)
+    for j in range(d):
+        out[j] /= norm
+
+
+def countKernel(method, center, radius, squaredThreshold, key, first, count, counts):
+    """
+    Generates the chords first to first + count - 1 of the ball of the given
+    center and radius with the given method, from the stream of the given key.
+    Adds their relative lengths to the histogram counts and returns the number
+    of chords whose squared length is more than squaredThreshold. Raises
+    ValueError if a length is not finite (as Histogram.add).
+    """
+    d = len(center)
+    bins = len(counts)
+    pairs = (d + 1)//2
+    draws = 2*pairs
+    scale = bins/(2*radius)
+    success = 0
+    a = [0.]*d
+    b = [0.]*d
+    w = [0.]*d
+
+    for i in range(first, first + count):
+        if method == 1:
+            direction(key, i, 0, pairs, a)
+            direction(key, i, draws, pairs, b)
+            for j in range(d):
+                a[j] = center[j] + radius*a[j]
+                b[j] = center[j] + radius*b[j]
+        else:
+            # middle of the chord, in a
+            direction(key, i, 0, pairs, a)
+            u = uniform(key, i, draws)
+            distance = radius*u if method == 2 else radius*u**(1/d)
+            squared = 0.
+            for j in range(d):
+                a[j] = center[j] + distance*a[j]
+                squared += (a[j] - center[j])*(a[j] - center[j])
+
+            # random direction orthogonal to the center -> middle one, in w
+            direction(key, i, draws + 1, pairs, w)
+            dot = 0.
+            for j in range(d):
+                dot += w[j]*(a[j] - center[j])
+            factor = dot/(squared if squared > 0 else 1)
+            norm = 0.
+            for j in range(d):
+                w[j] -= factor*(a[j] - center[j])
+                norm += w[j]*w[j]
+            half = math.sqrt(max(radius**2 - squared, 0))
+            norm = math.sqrt(norm)
+            for j in range(d):
+                w[j] = w[j]/norm*half
+                b[j] = a[j] - w[j]
+                a[j] = a[j] + w[j]
+
+        squared = 0.
+        for j in range(d):
+            squared += (b[j] - a[j])*(b[j] - a[j])
+        # a NaN would give a negative bin, written out of the counts by Numba
+        if not math.isfinite(squared):
+            raise ValueError("the chord lengths must be finite")
+        if squared > squaredThreshold:
+            success += 1
+        counts[min(int(math.sqrt(squared)*scale), bins - 1)] += 1
+
+    return success
+
+
+if NUMBA_AVAILABLE:
+    @numba.njit
+    def uniform64(key, index, draw):
+        """
+        Same as uniform, on 64 bits unsigned integers.
+        """
+        x = np.uint64(index)*np.uint64(GAMMA) + key
+        x = (x ^ (x >> np.uint64(30)))*np.uint64(MIX_1)
+        x = (x ^ (x >> np.uint64(27)))*np.uint64(MIX_2)
+        row = x ^ (x >> np.uint64(31))
+        x = row + np.uint64(draw + 1)*np.uint64(GAMMA)
+        x = (x ^ (x >> np.uint64(30)))*np.uint64(MIX_1)
+        x = (x ^ (x >> np.uint64(27)))*np.uint64(MIX_2)
+        bits = x ^ (x >> np.uint64(31))
+        return (float(bits >> np.uint64(11)) + 0.5)*2.**-53
+
+### functions
+
+def compiled():
+    """
+    Returns countKernel compiled with Numba, the kernels calling uniform64
+    instead of uniform.
+    """
+    global __compiled
+    if __compiled is None:
+        namespace = dict(globals(), uniform = uniform64)
+        namespace["direction"] = numba.njit(types.FunctionType(direction.__code__, namespace))
+        __compiled = numba.njit(types.FunctionType(countKernel.__code__, namespace))
+    return __compiled
+
+
+def setBackend(name):
+    """
+    Sets the backend used by default by the runner.
+    """
+    global BACKEND
+    if name not in BACKENDS:
+        sys.exit("Unknown backend " + str(name) + " (available : " + ", ".join(BACKENDS) + ").")
+    if name == "numba" and not NUMBA_AVAILABLE:
+        sys.exit("The numba backend needs Numba to be installed.")
+    BACKEND = name
+
+
+def countChords(ball, method, stream, first, count, histogram, backend):
+    """
+    Generates the chords first to first + count - 1 of the given Ball with the
+    given method and Stream, with a kernel of the given backend ("numba" or
+    "python"). Adds them to the Histogram and returns the number of chords
+    longer than the threshold.
+    """
+    squaredThreshold = ball.squaredThreshold()
+    if backend == "numba":
+        counts = np.zeros(len(histogram.counts), dtype = np.int64)
+        success = compiled()(method, ball.center.astype(np.float64), float(ball.radius),
+                             squaredThreshold, np.uint64(stream.key), first, count, counts)
+    else:
+        counts = [0]*len(histogram.counts)
+        success = countKernel(method, ball.center.tolist(), ball.radius, squaredThreshold,
+                              stream.key, first, count, counts)
+    histogram.counts += np.asarray(counts, dtype = np.int64)
+    return success
+
+
+### tests
+
+def benchmark(n = 10**6, dimension = 2, seed = 1):
+    """
+    Prints the throughput of each available backend for each method, and
+    checks that they all give the same counts.
+    """
+    from simulation import run, Ball, METHODS # simulation imports this module
+
+    ball = Ball(dimension, 300)
+    for method in METHODS:
+        results = {}
+        for backend in BACKENDS:
+            if backend == "numba" and not NUMBA_AVAILABLE:
+                continue
+            count = n//100 if backend == "python" else n
+            if backend == "numba":
+                run(ball, method, 1, seed = seed, backend = backend) # compiling
+            summary = run(ball, method, count, seed = seed, backend = backend)
+            results[backend] = run(ball, method, n//100, seed = seed, backend = backend)
+            print("method " + str(method) + ", " + backend.ljust(6) + " : "
+                  + str(round(summary.throughput())).rjust(10) + " chords/s")
+        same = len({(summary.estimator.success, tuple(summary.histogram.counts.tolist()))
+                    for summary in results.values()}) == 1
+        print("method " + str(method) + " : same counts for all backends :", same)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,177 @@
+"""
+This module contains the memory profiling mode of the runs : the growth of the
+resident memory of the process at its peak (Linux only), and the memory allocated by the lines of the project
+(the Point and Line objects of geometry.py, the canvas items of upemtk, the
+batches of ball.py...), traced with tracemalloc. The chords being generated
+then dropped, the memory per chord should stay near 0 : tracking it shows the
+regressions which keep chords alive.
+
+Usage : python profiling.py (profiles the batched runs of each method)
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import os
+import sys
+import tracemalloc
+
+### global variables
+
+PROFILED_FILES = ("geometry.py", "upemtk.py", "ball.py", "streams.py", "simulation.py",
+                  "kernels.py")
+TOP            = 10 # number of call sites shown in the reports
+PROC_PATH      = "/proc/self" # process information of Linux
+
+### class
+
+class MemoryProfile:
+    """
+    This class is designed for the memory profile of a block of code (used as
+    a context manager) : the growth of the resident memory of the process at
+    its peak (None where its peak cannot be reset, cf resetPeakRss), the peak and
+    retained traced memory, and the call sites of the profiled files with the
+    most retained memory. The chords counted in the block are given with
+    setChords, to get the memory per chord.
+    """
+    def __init__(self, files = PROFILED_FILES, top = TOP):
+        self.files = files
+        self.top = top
+        self.chords = 0
+        self.peakRss = None   # bytes at the peak, more than at the start, None if unknown
+        self.peak = 0         # bytes traced at the peak, more than at the start
+        self.retained = 0     # bytes traced at the end, more than at the start
+        self.sites = []       # (file:line, bytes, blocks) retained by the call sites
+        self.canvasItems = None
+
+
+    def __enter__(self):
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        # ru_maxrss would be the peak of the whole process, the same for the next blocks
+        self.startRss = processMemory("VmRSS") if resetPeakRss() else None
+        self.before = tracemalloc.take_snapshot()
+        self.start = tracemalloc.get_traced_memory()[0]
+        return self
+
+
+    def __exit__(self, *exception):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = peak - self.start
+        self.retained = current - self.start
+        filters = [tracemalloc.Filter(True, "*" + os.sep + name) for name in self.files]
+        after = tracemalloc.take_snapshot().filter_traces(filters)
+        self.sites = [(os.path.basename(stat.traceback[0].filename) + ":"
+                       + str(stat.traceback[0].lineno), stat.size_diff, stat.count_diff)
+                      for stat in after.compare_to(self.before.filter_traces(filters), "lineno")
+                      if stat.size_diff][:self.top]
+        if self.started:
+            tracemalloc.stop()
+        del self.before
+
+        peakRss = processMemory("VmHWM")
+        if self.startRss is not None and peakRss is not None:
+            self.peakRss = peakRss - self.startRss
+        self.canvasItems = canvasItems()
+        return False
+
+
+    def __str__(self):
+        lines = ["memory : " + ("" if self.peakRss is None
+                                else "RSS growth at the peak " + sizeString(self.peakRss) + ", ")
+                 + "traced peak " + sizeString(self.peak)
+                 + ", retained " + sizeString(self.retained)]
+        if self.chords:
+            lines.append("per chord : " + format(self.peak/self.chords, ".2f") + " bytes at the peak, "
+                         + format(self.retained/self.chords, ".2f") + " bytes retained")
+        if self.canvasItems is not None:
+            lines.append("canvas items : " + str(self.canvasItems))
+        for site, size, count in self.sites:
+            lines.append("    " + site.ljust(20) + sizeString(size).rjust(12)
+                         + str(count).rjust(10) + " blocks")
+        return "\n".join(lines)
+
+
+    def setChords(self, chords):
+        """
+        Sets the number of chords counted in the profiled block.
+        """
+        self.chords = chords
+
+
+### functions
+
+def sizeString(size):
+    """
+    Returns the given number of bytes as a string, in B, kB or MB.
+    """
+    if size is None:
+        return "?"
+    if abs(size) < 2**10:
+        return str(size) + " B"
+    if abs(size) < 2**20:
+        return format(size/2**10, ".1f") + " kB"
+    return format(size/2**20, ".2f") + " MB"
+
+
+def resetPeakRss():
+    """
+    Resets the peak resident memory of the process to the current one (Linux
+    only). Returns True if it has been reset.
+    """
+    try:
+        with open(os.path.join(PROC_PATH, "clear_refs"), "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def processMemory(field):
+    """
+    Returns the given memory field (in kB) of the status of the process, as a
+    number of bytes, or None if it is unknown (Linux only).
+    """
+    try:
+        with open(os.path.join(PROC_PATH, "status")) as file:
+            for line in file:
+                name, _, value = line.partition(":")
+                if name == field:
+                    return int(value.split()[0])*1024
+    except OSError:
+        pass
+    return None
+
+
+def canvasItems():
+    """
+    Returns the number of items of the canvas of the upemtk window, or None if
+    there is no window.
+    """
+    upemtk = sys.modules.get("upemtk")
+    if upemtk is None:
+        return None
+    try:
+        return upemtk.nombre_objets()
+    except upemtk.FenetreNonCree:
+        return None
+
+
+### tests
+
+def profilingTest(n = 10**6):
+    from simulation import run, Ball, METHODS, kernels # simulation imports this module
+
+    ball = Ball(2, 300)
+    run(ball, 1, 1) # compiling the kernels, if any
+    for method in METHODS:
+        for backend in sorted({"numpy", kernels.BACKEND}):
+            print(backend, ":", run(ball, method, n, backend = backend, profile = True))
+
+
+if __name__ == "__main__":
+    profilingTest()
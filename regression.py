@@ -0,0 +1,179 @@
+"""
+This module contains the regression checks of the chord generators : at fixed
+seeds, the estimated probabilities of each method must be within tolerance of
+the exact ones (1/3, 1/2 and 1/4 in dimension 2) and the same for all the
+backends, and the throughput of the scalar path (the "python" kernel, one
+chord at a time) and of the batched ones ("numpy", "numba") must stay above a
+fraction of the baselines stored in regression.json. A biased sampler or a
+slower hot path makes the checks fail, with a nonzero exit status.
+
+The throughputs are measured in CPU time of the process, which another job
+running on the machine does not slow down as much as the elapsed time. They
+are only checked on the machine of the baselines.
+
+Usage : python regression.py [--update] (--update stores the measured
+throughputs as the new baselines)
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import os
+import sys
+import json
+import math
+import time
+import platform
+from simulation import *
+
+### global variables
+
+SEEDS          = (1, 2, 3)  # seeds of the accuracy checks
+CHORDS         = {"python": 2*10**4, "numpy": 10**6, "numba": 10**6} # chords per run
+Z_MAX          = 5          # tolerance, in standard errors of the estimate
+FLOOR          = 0.5        # minimal throughput, as a fraction of the baseline
+REPEATS        = 5          # the best of REPEATS runs is kept as the throughput
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regression.json")
+
+### functions
+
+def backends():
+    """
+    Returns the backends available here, the scalar one first.
+    """
+    return ["python", "numpy"] + (["numba"] if kernels.NUMBA_AVAILABLE else [])
+
+
+def accuracyChecks(ball):
+    """
+    Runs each method with each backend at the seeds SEEDS, and returns the
+    list of (name, passed, message) of the checks : the estimate is within
+    Z_MAX standard errors of the exact probability, and the scalar and batched
+    backends count the same chords longer than the threshold.
+    """
+    checks = []
+    for method in METHODS:
+        expected = analyticProbability(method, ball.dimension)
+        for seed in SEEDS:
+            counts = {}
+            for backend in backends():
+                n = CHORDS[backend]
+                estimator = run(ball, method, n, seed = seed, backend = backend).estimator
+                tolerance = Z_MAX*math.sqrt(expected*(1 - expected)/n)
+                error = estimator.ratio() - expected
+                checks.append(("accuracy method " + str(method) + " seed " + str(seed)
+                               + " " + backend, abs(error) <= tolerance,
+                               "p = " + format(estimator.ratio(), ".5f") + ", expected "
+                               + format(expected, ".5f") + " +- " + format(tolerance, ".5f")))
+                # the first chords of the run, on which all the backends are compared
+                counts[backend] = run(ball, method, CHORDS["python"], seed = seed,
+                                      backend = backend).estimator.success
+            checks.append(("same counts method " + str(method) + " seed " + str(seed),
+                           len(set(counts.values())) == 1, str(counts)))
+    return checks
+
+
+def throughputs(ball):
+    """
+    Returns the dict of the throughputs (chords per second of CPU time, best
+    of REPEATS runs) of each backend and method, keyed by backend then method
+    (as a string).
+    """
+    measures = {}
+    for backend in backends():
+        measures[backend] = {}
+        for method in METHODS:
+            run(ball, method, 1, seed = SEEDS[0], backend = backend) # compiling, if needed
+            measures[backend][str(method)] = max(
+                cpuThroughput(ball, method, CHORDS[backend], backend) for repeat in range(REPEATS))
+    return measures
+
+
+def cpuThroughput(ball, method, n, backend):
+    """
+    Runs n chords of the given method with the given backend, and returns the
+    number of chords generated per second of CPU time of the process.
+    """
+    start = time.process_time()
+    total = run(ball, method, n, seed = SEEDS[0], backend = backend).estimator.total
+    return total/max(time.process_time() - start, 1e-9)
+
+
+def throughputChecks(measures, baselines):
+    """
+    Returns the list of (name, passed, message) of the checks of the measured
+    throughputs against FLOOR times the baselines (passed if there is no
+    baseline).
+    """
+    checks = []
+    for backend, methods in measures.items():
+        for method, throughput in methods.items():
+            baseline = baselines.get(backend, {}).get(method)
+            message = str(round(throughput)) + " chords/s (CPU)"
+            if baseline is None:
+                checks.append(("throughput method " + method + " " + backend, True,
+                               message + ", no baseline"))
+                continue
+            checks.append(("throughput method " + method + " " + backend,
+                           throughput >= FLOOR*baseline,
+                           message + ", floor " + str(round(FLOOR*baseline))
+                           + " (baseline " + str(round(baseline)) + ")"))
+    return checks
+
+
+def loadBaselines(path = BASELINES_PATH):
+    """
+    Returns the (machine, baselines) couple stored in the JSON file of the
+    given path : the machine they have been measured on (cf platform.platform)
+    and the throughputs (None, {} if there is no file).
+    """
+    if not os.path.exists(path):
+        return None, {}
+    with open(path) as file:
+        baselines = json.load(file)
+    return baselines["machine"], baselines["throughputs"]
+
+
+def saveBaselines(measures, path = BASELINES_PATH):
+    """
+    Stores the given throughputs as the baselines, with the machine they have
+    been measured on.
+    """
+    with open(path, "w") as file:
+        json.dump({"machine": platform.platform(),
+                   "python": platform.python_version(),
+                   "throughputs": {backend: {method: round(throughput)
+                                             for method, throughput in methods.items()}
+                                   for backend, methods in measures.items()}},
+                  file, indent = 4)
+        file.write("\n")
+
+
+### tests
+
+def regressionTest(update = False):
+    ball = Ball(2, 300)
+    measures = throughputs(ball)
+    machine, baselines = loadBaselines()
+    checks = accuracyChecks(ball)
+    if machine in (None, platform.platform()):
+        checks += throughputChecks(measures, baselines)
+    else:
+        print("warning : throughput checks skipped, the baselines have been measured on",
+              machine, "(--update to measure them here)")
+    for name, passed, message in checks:
+        print(("ok  " if passed else "FAIL") + " " + name.ljust(34) + message)
+    if update:
+        saveBaselines(measures)
+        print("baselines stored in", BASELINES_PATH)
+
+    failed = sum(not passed for name, passed, message in checks)
+    if failed:
+        sys.exit(str(failed) + " of " + str(len(checks)) + " checks failed.")
+    print("all", len(checks), "checks passed")
+
+
+if __name__ == "__main__":
+    regressionTest("--update" in sys.argv[1:])
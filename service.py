@@ -0,0 +1,449 @@
+"""
+This module contains a local HTTP service running simulations for other
+programs. Jobs are queued and run by a bounded pool of worker processes, by
+chunks of chords, so their progress can be followed while they run. Finished
+jobs are cached : submitting the same job again returns the known result at
+once (and submitting a job identical to a queued or running one returns it).
+
+The API speaks JSON :
+    POST /jobs              {"method", "radius", "n" or "tolerance", "seed", "dimension", "bins"}
+                            -> 202 (new job) or 200 (known job) : the job
+    GET  /jobs              -> the list of the jobs
+    GET  /jobs/ID           -> the job : {"id", "status", "request", "progress", "result"}
+    GET  /jobs/ID/progress  -> the job, then one line per chunk until it is finished
+                               (application/x-ndjson, chunked transfer)
+A job with a tolerance runs until the half width of the 95% confidence
+interval is at most the tolerance (or MAX_CHORDS chords have been generated).
+
+Usage : python service.py [--host HOST] [--port PORT] [--workers N]
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import sys
+import json
+import math
+import time
+import secrets
+import asyncio
+import argparse
+import functools
+import multiprocessing
+import concurrent.futures
+from collections import OrderedDict
+from simulation import *
+
+### global variables
+
+HOST          = "127.0.0.1"
+PORT          = 8080
+WORKERS       = 2      # number of worker processes, i.e. of jobs running at once
+QUEUE_SIZE    = 64     # number of jobs waiting to be run
+CACHE_SIZE    = 256    # number of finished jobs kept
+CHUNK_SIZE    = 2**20  # number of chords run between two progress updates
+MAX_CHORDS    = 10**10 # number of chords after which a job with a tolerance stops
+MAX_DIMENSION = 100    # largest dimension of a job (a batch of chords takes
+                       # memory proportional to it)
+MAX_BINS      = 10**6  # largest number of histogram bins of a job
+REASONS       = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+### class
+
+class Job:
+    """
+    This class is designed for a simulation requested to the service,
+    represented by its normalized request (the key of the cache), its status
+    ("queued", "running", "done" or "failed") and its current counts.
+    """
+    def __init__(self, number, request):
+        self.id = str(number)
+        self.request = request
+        self.status = "queued"
+        self.seed = request["seed"] if request["seed"] is not None else secrets.randbits(64)
+        self.estimator = Estimator()
+        self.histogram = Histogram(request["bins"])
+        self.seconds = 0.
+        self.error = None
+        self.changed = asyncio.Condition() # notified at each update
+
+
+    def finished(self):
+        """
+        Returns true if the job will not change anymore.
+        """
+        return self.status in ("done", "failed")
+
+
+    def remaining(self):
+        """
+        Returns the number of chords of the next chunk (0 if the job is over).
+        """
+        total = self.estimator.total
+        if self.request["n"] is not None:
+            return min(CHUNK_SIZE, self.request["n"] - total)
+        if total and self.estimator.halfWidth() <= self.request["tolerance"]:
+            return 0
+        return min(CHUNK_SIZE, MAX_CHORDS - total)
+
+
+    def state(self):
+        """
+        Returns the JSON-compatible description of the job.
+        """
+        ball = Ball(self.request["dimension"], self.request["radius"])
+        low, high = self.estimator.confidenceInterval()
+        state = {"id": self.id, "status": self.status, "request": self.request,
+                 "progress": {"total": self.estimator.total, "target": self.request["n"],
+                              "p": self.estimator.ratio(), "low": low, "high": high}}
+        if self.status == "done":
+            summary = RunSummary(ball, self.request["method"], self.estimator,
+                                 self.histogram, self.seconds, self.seed)
+            state["result"] = {"p": self.estimator.ratio(), "low": low, "high": high,
+                               "success": self.estimator.success,
+                               "total": self.estimator.total,
+                               "expected": analyticProbability(self.request["method"],
+                                                               ball.dimension),
+                               "seed": self.seed, "seconds": self.seconds,
+                               "throughput": summary.throughput(),
+                               "histogram": self.histogram.counts.tolist()}
+        if self.status == "failed":
+            state["error"] = self.error
+        return state
+
+
+class Service:
+    """
+    This class is designed for the HTTP service listening on (host, port). Its
+    jobs are run by workers worker processes, queueSize jobs at most waiting
+    for one of them.
+    """
+    def __init__(self, host = HOST, port = PORT, workers = WORKERS, queueSize = QUEUE_SIZE,
+                 cacheSize = CACHE_SIZE):
+        self.host, self.port = host, port
+        self.workers = workers
+        self.cacheSize = cacheSize
+        self.jobs = OrderedDict() # jobs by id, the oldest first
+        self.known = {}           # jobs by normalized request
+        self.count = 0
+        self.queue = asyncio.Queue(queueSize)
+        self.pool = None
+        self.server = None
+
+
+    async def start(self):
+        """
+        Starts the worker pool and the server. Returns the listened (host, port).
+        """
+        self.pool = newPool(self.workers)
+        for i in range(self.workers):
+            asyncio.create_task(self.work())
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        return self.server.sockets[0].getsockname()[:2]
+
+
+    async def stop(self):
+        """
+        Stops the server and the worker pool.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        self.pool.shutdown(cancel_futures = True)
+
+
+    def submit(self, request):
+        """
+        Returns the (job, known) couple of the job of the given normalized
+        request : the cached or current one if any, else a new queued one.
+        Raises asyncio.QueueFull if there is no room for a new job.
+        """
+        key = json.dumps(request, sort_keys = True)
+        if key in self.known:
+            return self.known[key], True
+        job = Job(self.count + 1, request)
+        self.queue.put_nowait(job)
+        self.count += 1
+        self.jobs[job.id] = job
+        self.known[key] = job
+
+        # forgetting the oldest finished jobs
+        finished = [old for old in self.jobs.values() if old.finished()]
+        for old in finished[:max(0, len(finished) - self.cacheSize)]:
+            del self.jobs[old.id]
+            self.forget(old)
+        return job, False
+
+
+    def forget(self, job):
+        """
+        Removes the given job from the cache, if it is the cached job of its
+        request.
+        """
+        key = json.dumps(job.request, sort_keys = True)
+        if self.known.get(key) is job:
+            del self.known[key]
+
+
+    async def work(self):
+        """
+        Runs the queued jobs one after the other, chunk by chunk, in a process
+        of the pool.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            request = job.request
+            ball = Ball(request["dimension"], request["radius"])
+            job.status = "running"
+            try:
+                while job.remaining():
+                    pool = self.pool
+                    summary = await loop.run_in_executor(pool, functools.partial(
+                        run, ball, request["method"], job.remaining(), seed = job.seed,
+                        bins = request["bins"], first = job.estimator.total))
+                    job.estimator.merge(summary.estimator)
+                    job.histogram.merge(summary.histogram)
+                    job.seconds += summary.seconds
+                    await notify(job)
+                job.status = "done"
+            except concurrent.futures.process.BrokenProcessPool as error:
+                # a worker has been killed (out of memory...) : the next jobs get a new pool
+                job.status, job.error = "failed", repr(error)
+                self.forget(job)
+                if self.pool is pool:
+                    self.pool = newPool(self.workers)
+            except Exception as error:
+                job.status, job.error = "failed", repr(error)
+                # the same request submitted again is run again
+                self.forget(job)
+            await notify(job)
+            self.queue.task_done()
+
+
+    async def handle(self, reader, writer):
+        """
+        Answers an HTTP request.
+        """
+        try:
+            verb, path, body = await readRequest(reader)
+            parts = path.strip("/").split("/")
+            if parts[0] != "jobs" or len(parts) > 3 or (len(parts) == 3 and parts[2] != "progress"):
+                await respond(writer, 404, {"error": "unknown path " + path})
+            elif len(parts) == 1 and verb == "POST":
+                try:
+                    job, known = self.submit(normalizedRequest(json.loads(body or b"{}")))
+                    await respond(writer, 200 if known else 202, job.state())
+                except (ValueError, TypeError) as error:
+                    await respond(writer, 400, {"error": str(error)})
+                except asyncio.QueueFull:
+                    await respond(writer, 503, {"error": "too many queued jobs"})
+            elif verb != "GET":
+                await respond(writer, 405, {"error": "method " + verb + " not allowed"})
+            elif len(parts) == 1:
+                await respond(writer, 200, [{"id": job.id, "status": job.status}
+                                            for job in self.jobs.values()])
+            elif parts[1] not in self.jobs:
+                await respond(writer, 404, {"error": "unknown job " + parts[1]})
+            elif len(parts) == 2:
+                await respond(writer, 200, self.jobs[parts[1]].state())
+            else:
+                await streamProgress(writer, self.jobs[parts[1]])
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+### functions
+
+def normalizedRequest(request):
+    """
+    Returns the complete request of a job (with the default values) from the
+    given JSON object. Raises ValueError if it is not valid.
+    """
+    if not isinstance(request, dict):
+        raise ValueError("the job must be a JSON object")
+    unknown = set(request) - {"method", "radius", "n", "tolerance", "seed", "dimension", "bins"}
+    if unknown:
+        raise ValueError("unknown fields " + ", ".join(sorted(unknown)))
+    normalized = {"method": request.get("method"), "radius": request.get("radius", 1),
+                  "n": request.get("n"), "tolerance": request.get("tolerance"),
+                  "seed": request.get("seed"), "dimension": request.get("dimension", 2),
+                  "bins": request.get("bins", BINS)}
+
+    for field, value in normalized.items():
+        if isinstance(value, bool): # a bool is an int for isinstance
+            raise ValueError(field + " must be a number, not a boolean")
+    if normalized["method"] not in METHODS:
+        raise ValueError("method must be one of " + ", ".join(map(str, METHODS)))
+    if not isPositive(normalized["radius"]):
+        raise ValueError("radius must be a finite positive number")
+    for field, low, high in (("dimension", 2, MAX_DIMENSION), ("bins", 1, MAX_BINS)):
+        if not isinstance(normalized[field], int) or not low <= normalized[field] <= high:
+            raise ValueError(field + " must be an integer between " + str(low) + " and "
+                             + str(high))
+    if normalized["seed"] is not None and not isinstance(normalized["seed"], int):
+        raise ValueError("seed must be an integer")
+    if (normalized["n"] is None) == (normalized["tolerance"] is None):
+        raise ValueError("exactly one of n and tolerance must be given")
+    if normalized["n"] is not None and (not isinstance(normalized["n"], int)
+                                        or not 0 < normalized["n"] <= MAX_CHORDS):
+        raise ValueError("n must be an integer between 1 and " + str(MAX_CHORDS))
+    if normalized["tolerance"] is not None and not isPositive(normalized["tolerance"]):
+        raise ValueError("tolerance must be a finite positive number")
+    return normalized
+
+
+def isPositive(value):
+    """
+    Returns True if the given JSON value is a finite positive number (json.loads
+    reads 1e400 as inf).
+    """
+    return isinstance(value, (int, float)) and math.isfinite(value) and value > 0
+
+
+def newPool(workers):
+    """
+    Returns a new pool of the given number of worker processes.
+    """
+    # forked workers would keep the sockets of the open connections
+    return concurrent.futures.ProcessPoolExecutor(
+        workers, mp_context = multiprocessing.get_context("spawn"))
+
+
+async def notify(job):
+    """
+    Wakes up the clients following the progress of the given Job.
+    """
+    async with job.changed:
+        job.changed.notify_all()
+
+
+async def readRequest(reader):
+    """
+    Reads an HTTP request and returns its (verb, path, body) triple.
+    """
+    line = (await reader.readline()).decode("latin-1").split()
+    if len(line) != 3:
+        raise ValueError("malformed request line")
+    headers = {}
+    while True:
+        header = (await reader.readline()).decode("latin-1").strip()
+        if not header:
+            break
+        name, _, value = header.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    return line[0].upper(), line[1].split("?")[0], await reader.readexactly(length)
+
+
+async def respond(writer, status, content):
+    """
+    Writes an HTTP response of the given status, with a JSON body.
+    """
+    body = json.dumps(content).encode()
+    writer.write(("HTTP/1.1 " + str(status) + " " + REASONS[status] + "\r\n"
+                  + "Content-Type: application/json\r\n"
+                  + "Content-Length: " + str(len(body)) + "\r\n"
+                  + "Connection: close\r\n\r\n").encode() + body)
+    await writer.drain()
+
+
+async def streamProgress(writer, job):
+    """
+    Writes the state of the given Job each time it changes, one JSON object
+    per line, until it is finished.
+    """
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                 b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+    line = None
+    while True:
+        # the lock is not held while writing : a client which stops reading
+        # must not block notify, hence the job
+        async with job.changed:
+            if line is not None and json.dumps(job.state()).encode() + b"\n" == line:
+                await job.changed.wait() # nothing new since the last line
+            line = json.dumps(job.state()).encode() + b"\n"
+            finished = job.finished()
+        writer.write(hex(len(line))[2:].encode() + b"\r\n" + line + b"\r\n")
+        await writer.drain()
+        if finished:
+            break
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def request(host, port, verb, path, content = None):
+    """
+    Sends an HTTP request to the service and returns the (status, lines)
+    couple of the answer, lines being the list of its JSON objects.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(content).encode() if content is not None else b""
+    writer.write((verb + " " + path + " HTTP/1.1\r\nHost: " + host + "\r\n"
+                  + "Content-Length: " + str(len(body)) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+    answer = await reader.read()
+    writer.close()
+
+    head, _, body = answer.partition(b"\r\n\r\n")
+    if b"chunked" in head.lower():
+        # the chunk sizes are lines which are not JSON objects
+        lines = [line for line in body.split(b"\r\n") if line.startswith(b"{")]
+    else:
+        lines = body.splitlines()
+    return int(head.split()[1]), [json.loads(line) for line in lines]
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description = "Local HTTP service running simulations.")
+    parser.add_argument("--host", default = HOST)
+    parser.add_argument("--port", type = int, default = PORT)
+    parser.add_argument("--workers", type = int, default = WORKERS)
+    parser.add_argument("--queue", type = int, default = QUEUE_SIZE)
+    arguments = parser.parse_args(arguments)
+
+    async def serve():
+        service = Service(arguments.host, arguments.port, arguments.workers, arguments.queue)
+        host, port = await service.start()
+        print("Service listening on", host, port, file = sys.stderr)
+        await service.server.serve_forever()
+
+    asyncio.run(serve())
+
+
+### tests
+
+async def serviceTest():
+    service = Service(port = 0)
+    host, port = await service.start()
+    job = {"method": 1, "radius": 300, "n": 10**7, "seed": 42}
+
+    status, [state] = await request(host, port, "POST", "/jobs", job)
+    print(status, state["status"])
+    status, states = await request(host, port, "GET", "/jobs/" + state["id"] + "/progress")
+    for state in states:
+        print(state["status"], state["progress"]["total"], state["progress"]["p"])
+
+    start = time.perf_counter()
+    status, [state] = await request(host, port, "POST", "/jobs", job)
+    print(status, state["result"]["p"], "(cached, " + str(time.perf_counter() - start) + " s)")
+    print(await request(host, port, "POST", "/jobs", {"method": 4, "n": 10}))
+
+    status, [state] = await request(host, port, "POST", "/jobs",
+                                    {"method": 3, "tolerance": 1e-3, "seed": 1})
+    while state["status"] != "done":
+        await asyncio.sleep(0.5)
+        status, [state] = await request(host, port, "GET", "/jobs/" + state["id"])
+    print(state["result"]["total"], "chords :", state["result"]["low"], state["result"]["high"])
+    await service.stop()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(sys.argv[1:])
+    else:
+        asyncio.run(serviceTest())
@@ -0,0 +1,510 @@
+"""
+This module contains the simulation tools used to compare the chord generation
+methods : a runner generating chords by batches, which are counted and dropped,
+a probability estimator, a histogram of chord lengths and a reservoir keeping a
+sample of the chords.
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import sys
+import math
+import time
+import contextlib
+import concurrent.futures
+import numpy as np
+from ball import *
+from streams import *
+import kernels
+from profiling import *
+
+### global variables
+
+METHODS    = (1, 2, 3)
+BATCH_SIZE = 2**16 # number of chords generated at once
+BINS       = 50    # number of bins of the length histograms
+Z_95       = 1.959963984540054 # quantile of the 95% confidence intervals
+SNAPSHOTS_PER_DECADE = 10 # number of snapshots sent to a monitor per power of 10
+RESERVOIR_KEY = 0 # key of the random streams of the reservoirs (methods are 1, 2, 3)
+FLOAT32_MARGIN = 2**-16 # bound of the relative error of the float32 chord lengths
+
+### class
+
+class Estimator:
+    """
+    This class is designed for the estimation of the probability for a chord to
+    be longer than the threshold, represented by the number of such chords
+    (success) among all the generated ones (total).
+    """
+    def __init__(self, success = 0, total = 0):
+        self.success = success
+        self.total = total
+
+
+    def __str__(self):
+        low, high = self.confidenceInterval()
+        return "p = " + str(self.ratio()) + " (n = " + str(self.total) \
+                + ", 95% : [" + str(low) + ", " + str(high) + "])"
+
+
+    def add(self, success, total):
+        """
+        Counts total more chords, success of them being longer than the
+        threshold.
+        """
+        self.success += int(success)
+        self.total += int(total)
+
+
+    def merge(self, estimator):
+        """
+        Adds the counts of an other Estimator to the current one.
+        """
+        self.add(estimator.success, estimator.total)
+
+
+    def ratio(self):
+        """
+        Returns the estimated probability (0 if no chord has been counted).
+        """
+        return self.success/self.total if self.total else 0
+
+
+    def standardError(self):
+        """
+        Returns the standard error of the estimated probability.
+        """
+        if not self.total:
+            return math.inf
+        p = self.ratio()
+        return math.sqrt(p*(1 - p)/self.total)
+
+
+    def confidenceInterval(self, z = Z_95):
+        """
+        Returns the (low, high) Wilson confidence interval of the probability,
+        95% by default.
+        """
+        if not self.total:
+            return 0, 1
+        n, p = self.total, self.ratio()
+        center = (p + z**2/(2*n))/(1 + z**2/n)
+        half = z/(1 + z**2/n)*math.sqrt(p*(1 - p)/n + z**2/(4*n**2))
+        return max(center - half, 0), min(center + half, 1)
+
+
+    def halfWidth(self, z = Z_95):
+        """
+        Returns the half width of the confidence interval.
+        """
+        low, high = self.confidenceInterval(z)
+        return (high - low)/2
+
+
+class Histogram:
+    """
+    This class is designed for the distribution of the chord lengths, divided by
+    the diameter so that they lie in [0, 1], which is cut in bins of the same
+    width.
+    """
+    def __init__(self, bins = BINS):
+        self.counts = np.zeros(bins, dtype = np.int64)
+
+
+    def __str__(self):
+        return " ".join(str(count) for count in self.counts.tolist())
+
+
+    def add(self, lengths, diameter):
+        """
+        Counts a batch of chord lengths. Raises ValueError if one of them is
+        not finite (as the kernels, cf kernels.py).
+        """
+        if not np.isfinite(lengths).all():
+            raise ValueError("the chord lengths must be finite")
+        bins = len(self.counts)
+        indices = np.minimum((lengths*(bins/diameter)).astype(np.int64), bins - 1)
+        self.counts += np.bincount(indices, minlength = bins)
+
+
+    def merge(self, histogram):
+        """
+        Adds the counts of an other Histogram to the current one.
+        """
+        self.counts += histogram.counts
+
+
+    def density(self):
+        """
+        Returns the estimated density of the relative chord lengths on each bin.
+        """
+        total = self.counts.sum()
+        return self.counts*len(self.counts)/total if total else self.counts*0.
+
+
+class Reservoir:
+    """
+    This class is designed for a uniform random sample of fixed size of the
+    chords of an endless stream (Li's algorithm L : the number of chords to skip
+    before the next one to keep is drawn, so nothing is drawn for the skipped
+    ones). The draws come from a Stream of the given seed, so the sample is the
+    same for the same chords given in the same order.
+    """
+    def __init__(self, size, seed = None):
+        self.size = size
+        self.stream = Stream(seed, RESERVOIR_KEY)
+        self.a = self.b = None # ends of the kept chords, allocated at first add
+        self.seen = 0          # number of chords given to the reservoir
+        self.kept = 0          # number of chords kept (replacements included)
+        self.weight = 1.
+        self.next = size       # index of the next chord to keep
+
+
+    def __len__(self):
+        return min(self.seen, self.size)
+
+
+    def add(self, chords):
+        """
+        Gives a batch of chords to the reservoir.
+        """
+        a, b = chords
+        if self.a is None:
+            self.a = np.empty((self.size,) + a.shape[1:], dtype = a.dtype)
+            self.b = np.empty((self.size,) + b.shape[1:], dtype = b.dtype)
+            self.skip()
+
+        # filling the reservoir with the first chords
+        if self.seen < self.size:
+            count = min(self.size - self.seen, len(a))
+            self.a[self.seen:self.seen + count] = a[:count]
+            self.b[self.seen:self.seen + count] = b[:count]
+
+        # replacing random chords by the chords to keep
+        while self.next < self.seen + len(a):
+            slot = int(self.stream.uniform(self.kept, 0)*self.size)
+            self.a[slot] = a[self.next - self.seen]
+            self.b[slot] = b[self.next - self.seen]
+            self.kept += 1
+            self.skip()
+        self.seen += len(a)
+
+
+    def skip(self):
+        """
+        Draws the index of the next chord to keep.
+        """
+        u1, u2 = self.stream.uniform(self.kept, 1), self.stream.uniform(self.kept, 2)
+        self.weight *= math.exp(math.log(u1)/self.size)
+        self.next += int(math.log(u2)/math.log1p(-self.weight)) + (self.kept > 0)
+
+
+    def chords(self):
+        """
+        Returns the kept chords, as a batch of chords.
+        """
+        if self.a is None:
+            return np.empty((0, 0)), np.empty((0, 0))
+        return self.a[:len(self)], self.b[:len(self)]
+
+
+class RunSummary:
+    """
+    This class is designed for the result of a run : the Estimator and
+    Histogram of the chords generated with one method, the time it took, the
+    seed which gives the same results again and its MemoryProfile (cf
+    profiling.py) if it has been profiled.
+    """
+    def __init__(self, ball, method, estimator, histogram, seconds, seed = None,
+                 memory = None):
+        self.ball = ball
+        self.method = method
+        self.estimator = estimator
+        self.histogram = histogram
+        self.seconds = seconds
+        self.seed = seed
+        self.memory = memory
+
+
+    def __str__(self):
+        return "method " + str(self.method) + " (dimension " \
+                + str(self.ball.dimension) + ") : " + str(self.estimator) \
+                + ", expected " + str(analyticProbability(self.method, self.ball.dimension)) \
+                + ", " + str(round(self.throughput())) + " chords/s" \
+                + ("\n" + str(self.memory) if self.memory is not None else "")
+
+
+    def throughput(self):
+        """
+        Returns the number of chords generated per second.
+        """
+        return self.estimator.total/self.seconds if self.seconds else math.inf
+
+
+class ComparisonSummary:
+    """
+    This class is designed for the result of a comparison of the methods run
+    until the half widths of all their confidence intervals are at most the
+    tolerance : the RunSummary of each method, and the time it took.
+    """
+    def __init__(self, summaries, tolerance, seconds):
+        self.summaries = summaries
+        self.tolerance = tolerance
+        self.seconds = seconds
+
+
+    def __str__(self):
+        return "\n".join(str(summary) + " +- " + format(summary.estimator.halfWidth(), ".2g")
+                         for summary in self.summaries.values()) \
+                + "\n" + str(self.total()) + " chords for a tolerance of " + str(self.tolerance) \
+                + ", " + str(self.saved()) + " saved against the same number for each method"
+
+
+    def total(self):
+        """
+        Returns the number of chords generated for all the methods.
+        """
+        return sum(summary.estimator.total for summary in self.summaries.values())
+
+
+    def saved(self):
+        """
+        Returns the number of chords saved against the equal allocation, which
+        generates for each method the chords needed by the slowest one.
+        """
+        counts = [summary.estimator.total for summary in self.summaries.values()]
+        return len(counts)*max(counts) - sum(counts)
+
+
+### functions
+
+def analyticProbability(method, dimension = 2):
+    """
+    Returns the exact probability for a chord of a ball of the given dimension,
+    generated with the given method, to be longer than the side of the inscribed
+    regular simplex (1/3, 1/2 and 1/4 in dimension 2).
+    """
+    d = dimension
+    if method == 1:
+        # the angle theta between the ends has a density proportional to
+        # sin(theta)^(d - 2), and the chord is longer iff cos(theta) < -1/d
+        low, steps = math.acos(-1/d), 2000
+        h = (math.pi - low)/steps
+        values = [math.sin(low + i*h)**(d - 2) for i in range(steps + 1)]
+        part = h/3*(values[0] + values[-1] + 4*sum(values[1:-1:2]) + 2*sum(values[2:-1:2]))
+        whole = math.exp(math.lgamma((d - 1)/2) - math.lgamma(d/2))*math.sqrt(math.pi)
+        return part/whole
+    if method == 2:
+        # the middle is at a uniform distance of the center
+        return math.sqrt((d - 1)/(2*d))
+    if method == 3:
+        # the middle is uniform in the ball
+        return ((d - 1)/(2*d))**(d/2)
+    sys.exit("Unknown chord generation method " + str(method) + ".")
+
+
+def run(ball, method, n, batchSize = BATCH_SIZE, seed = None, bins = BINS,
+        first = 0, processes = 1, monitor = None, reservoir = None, backend = None,
+        profile = False):
+    """
+    Generates the chords first to first + n - 1 of the given Ball with the
+    given method, by batches of batchSize chords, and returns the RunSummary of
+    the simulation. The random stream of the run is given by the seed (a random
+    one if None, see RunSummary.seed) and the method, so the results are the
+    same for any batch size and any number of processes.
+    The snapshot(ball, method, estimator) method of the monitor (cf
+    dashboard.py) is called after logSpacedCounts(n) numbers of chords.
+    The chords are only counted, then dropped : the memory used does not depend
+    on n. A sample of them can be kept in the given Reservoir (which makes the
+    run sequential, as it needs the chords in order).
+    The chords are counted by the kernels of the given backend (cf kernels.py,
+    kernels.BACKEND by default), except for the "numpy" one and when they are
+    kept in a reservoir, which use the batches of ball.py (in the floating
+    point type of the Ball, see countLonger for float32).
+    If profile is true, the run is sequential and its memory is profiled (see
+    RunSummary.memory), tracemalloc slowing it down.
+    """
+    stream = Stream(seed, method)
+    backend = backend if backend is not None else kernels.BACKEND
+    if processes > 1 and reservoir is None and not profile:
+        return runParallel(ball, method, n, batchSize, stream.seed, bins, first,
+                           processes, monitor, backend)
+
+    estimator = Estimator()
+    histogram = Histogram(bins)
+    checkpoints = logSpacedCounts(n) if monitor is not None else []
+    checkpoint = 0
+    memory = MemoryProfile() if profile else None
+
+    with memory if memory is not None else contextlib.nullcontext():
+        start = time.perf_counter()
+        for batchFirst, count in batchRanges(first, n, batchSize, checkpoints):
+            if backend != "numpy" and reservoir is None:
+                estimator.add(kernels.countChords(ball, method, stream, batchFirst, count,
+                                                  histogram, backend), count)
+            else:
+                chords = ball.randomChords(method, batchFirst, count, stream)
+                estimator.add(countLonger(ball, method, stream, batchFirst,
+                                          chordSquaredLengths(chords), histogram), count)
+                if reservoir is not None:
+                    reservoir.add(chords)
+
+            if checkpoint < len(checkpoints) and estimator.total == checkpoints[checkpoint]:
+                monitor.snapshot(ball, method, estimator)
+                checkpoint += 1
+        seconds = time.perf_counter() - start
+
+    if memory is not None:
+        memory.setChords(estimator.total)
+    return RunSummary(ball, method, estimator, histogram, seconds, stream.seed, memory)
+
+
+def runParallel(ball, method, n, batchSize, seed, bins, first, processes, monitor,
+                backend):
+    """
+    Same as run, the chords being split between processes worker processes.
+    The monitor gets a snapshot each time a part is done.
+    """
+    chunk = max(batchSize, -(-n//(4*processes)))
+    estimator = Estimator()
+    histogram = Histogram(bins)
+
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(run, ball, method, min(chunk, first + n - chunkFirst),
+                               batchSize, seed, bins, chunkFirst, backend = backend)
+                   for chunkFirst in range(first, first + n, chunk)]
+        for future in futures:
+            estimator.merge(future.result().estimator)
+            histogram.merge(future.result().histogram)
+            if monitor is not None:
+                monitor.snapshot(ball, method, estimator)
+
+    return RunSummary(ball, method, estimator, histogram, time.perf_counter() - start, seed)
+
+
+def countLonger(ball, method, stream, first, squared, histogram):
+    """
+    Adds the lengths of a batch of chords (the chords first, first + 1... of
+    the given Ball, method and Stream), given squared, to the Histogram, and
+    returns the number of them longer than the threshold : their squared
+    lengths are compared to the squared threshold. The float32 lengths too
+    close to the threshold to be compared to it (or NaN) are computed again in
+    float64 by a kernel, so the counts are the same as in float64.
+    """
+    squaredThreshold = ball.squaredThreshold()
+    if squared.dtype == np.float64:
+        histogram.add(np.sqrt(squared), 2*ball.radius)
+        return np.count_nonzero(squared > squaredThreshold)
+
+    # lengths closer than margin to the threshold, from their squares
+    margin = FLOAT32_MARGIN*(ball.radius + float(np.abs(ball.center).max()))
+    margin = 2*ball.simplexSideLen()*margin + margin**2
+    close = ~(np.abs(squared - squaredThreshold) > margin)
+    histogram.add(np.sqrt(squared[~close]), 2*ball.radius)
+    success = np.count_nonzero(squared[~close] > squaredThreshold)
+    for i in np.flatnonzero(close).tolist():
+        success += kernels.countChords(ball, method, stream, first + i, 1, histogram, "python")
+    return success
+
+
+def compareMethods(ball, tolerance, batchSize = BATCH_SIZE, seed = None, bins = BINS,
+                   methods = METHODS, maxChords = 10**11, monitor = None, backend = None):
+    """
+    Runs the given methods on the given Ball until the half widths of their
+    95% confidence intervals are at most tolerance, and returns the
+    ComparisonSummary. After a first batch of each method, each batch goes to
+    the method whose interval is the widest, so no chord is spent on a method
+    which has already converged. A method stops after maxChords chords.
+    """
+    seed = seed if seed is not None else Stream().seed
+    summaries = {method: RunSummary(ball, method, Estimator(), Histogram(bins), 0, seed)
+                 for method in methods}
+
+    start = time.perf_counter()
+    while True:
+        unconverged = [summary for summary in summaries.values()
+                       if summary.estimator.total < maxChords
+                       and (not summary.estimator.total
+                            or summary.estimator.halfWidth() > tolerance)]
+        if not unconverged:
+            break
+        # the methods without chords have an infinite width
+        summary = max(unconverged, key = lambda summary: summary.estimator.halfWidth()
+                      if summary.estimator.total else math.inf)
+        batch = run(ball, summary.method, min(batchSize, maxChords - summary.estimator.total),
+                    batchSize, seed, bins, summary.estimator.total, backend = backend)
+        summary.estimator.merge(batch.estimator)
+        summary.histogram.merge(batch.histogram)
+        summary.seconds += batch.seconds
+        if monitor is not None:
+            monitor.snapshot(ball, summary.method, summary.estimator)
+
+    return ComparisonSummary(summaries, tolerance, time.perf_counter() - start)
+
+
+def chordBatches(ball, method, stream, first = 0, n = None, batchSize = BATCH_SIZE,
+                 cuts = ()):
+    """
+    Yields the (batchFirst, chords) batches of the chords first, first + 1...
+    of the given Ball, generated with the given method from the given Stream :
+    n chords, or an endless stream of them if n is None. The batches have at
+    most batchSize chords, and end after the given increasing numbers of chords
+    (cuts).
+    """
+    for batchFirst, count in batchRanges(first, n, batchSize, cuts):
+        yield batchFirst, ball.randomChords(method, batchFirst, count, stream)
+
+
+def batchRanges(first = 0, n = None, batchSize = BATCH_SIZE, cuts = ()):
+    """
+    Yields the (batchFirst, count) couples of the batches of chordBatches.
+    """
+    cuts = iter(cuts)
+    cut = next(cuts, None)
+    done = 0
+    while n is None or done < n:
+        count = batchSize if n is None else min(batchSize, n - done)
+        if cut is not None:
+            count = min(count, cut - done)
+        yield first + done, count
+        done += count
+        if done == cut:
+            cut = next(cuts, None)
+
+
+def logSpacedCounts(n, perDecade = SNAPSHOTS_PER_DECADE):
+    """
+    Returns the increasing list of about perDecade numbers of chords per power
+    of 10, from 1 to n (included).
+    """
+    counts = {n}
+    exponent = 0
+    while 10**(exponent/perDecade) < n:
+        counts.add(round(10**(exponent/perDecade)))
+        exponent += 1
+    return sorted(counts)
+
+
+### tests
+
+def simulationTest():
+    for dimension in (2, 3, 10):
+        ball = Ball(dimension, 300)
+        print(ball)
+        for method in METHODS:
+            print(run(ball, method, 10**6))
+    print(run(Ball(2, 300, dtype = np.float32), 1, 10**6, backend = "numpy")) # same counts
+
+    print(compareMethods(Ball(2, 300), 1e-3))
+
+    reservoir = Reservoir(1000)
+    print(run(Ball(2, 300), 1, 10**7, reservoir = reservoir))
+    print(len(reservoir), "chords kept")
+
+
+if __name__ == "__main__":
+    simulationTest()
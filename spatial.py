@@ -0,0 +1,384 @@
+"""
+This module contains a spatial index over the chords drawn in the window,
+built incrementally as batches of chords arrive, to find the chords near the
+mouse cursor.
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import math
+import time
+import numpy as np
+from ball import *
+from upemtk import * #credits : Arnaud Carayol, Cyril Nicaud, Carine Pivoteau
+
+### global variables
+
+windowWidth  = 1000
+windowHeight = 1000
+ANGLES       = 1024 # number of angle bins of the index
+OFFSET_WIDTH = 2**-6 # width of the first offset window searched by nearest, in pixels
+MAX_DRAWN    = 500  # maximal number of highlighted chords drawn at once
+FIRST_BINS   = 64   # number of angle bins searched first by a limited search
+
+### class
+
+class ChordIndex:
+    """
+    This class is designed for a spatial index of 2D chords (segments) lying in
+    the rectangle [xMin, xMax] x [yMin, yMax]. A chord crosses the whole circle,
+    so a grid of the plane would store it in dozens of cells : the index is
+    instead a uniform grid over the lines, each chord being stored once in the
+    bin of the angle of its normal, sorted by its offset (its signed distance to
+    the center of the rectangle). The distance from a point to a chord being at
+    least the distance to its line, the chords near a point are among the ones
+    whose offset is close to the projection of the point, in every angle bin.
+
+    The chords are numbered in their order of insertion. Each added batch
+    becomes a run of chords sorted by (angle bin, offset), with the position of
+    the first chord of each (angle bin, offset bin) cell, the offset bins of a
+    run being sized so that it has about one cell per chord, and runs of
+    similar sizes are merged so that there are O(log n) of them. The ends of
+    the chords are stored in the given floating point type.
+    """
+    def __init__(self, xMin = 0, yMin = 0, xMax = windowWidth, yMax = windowHeight,
+                 angles = ANGLES, offsetWidth = OFFSET_WIDTH, dtype = np.float64):
+        self.origin = np.array([(xMin + xMax)/2, (yMin + yMax)/2])
+        self.span = math.hypot(xMax - xMin, yMax - yMin)/2 + 1 # bounds the offsets
+        self.angles = angles
+        self.step = math.pi/angles
+        self.bins = np.arange(angles)
+        self.cosines = np.cos(np.arange(angles + 1)*self.step)
+        self.sines = np.sin(np.arange(angles + 1)*self.step)
+        self.normals = np.stack((self.cosines, self.sines), axis = 1)
+        # the angle bins in bit-reversed order : the first ones of any prefix are spread
+        bits = max(1, (angles - 1).bit_length())
+        self.spread = np.argsort([int(format(i, "0" + str(bits) + "b")[::-1], 2)
+                                  for i in range(angles)], kind = "stable")
+        self.offsetWidth = offsetWidth
+
+        self.ends = np.empty((1024, 4), dtype = dtype) # ax, ay, bx, by of each chord
+        self.count = 0
+        self.box = None # (xMin, yMin, xMax, yMax) bounding box of the chords
+        self.reach = 0. # radius of the disk of center origin holding the chords
+        self.runs = []  # (keys, numbers, offset bins per angle bin, cell starts) sorted by key
+
+
+    def __len__(self):
+        return self.count
+
+
+    def add(self, chords):
+        """
+        Adds a batch of chords (a couple (a, b) of (count, 2) arrays) to the
+        index and returns the number of the first one.
+        """
+        a, b = chords
+        count = len(a)
+        first = self.count
+        if first + count > len(self.ends):
+            ends = np.empty((max(2*len(self.ends), first + count), 4), dtype = self.ends.dtype)
+            ends[:first] = self.ends[:first]
+            self.ends = ends
+        self.ends[first:first + count, :2] = a
+        self.ends[first:first + count, 2:] = b
+        self.count += count
+        if count:
+            x = np.concatenate((a[:, 0], b[:, 0]))
+            y = np.concatenate((a[:, 1], b[:, 1]))
+            box = (float(x.min()), float(y.min()), float(x.max()), float(y.max()))
+            self.box = box if self.box is None else \
+                       (min(self.box[0], box[0]), min(self.box[1], box[1]),
+                        max(self.box[2], box[2]), max(self.box[3], box[3]))
+            self.reach = max(self.reach, float(np.hypot(x - self.origin[0],
+                                                        y - self.origin[1]).max()))
+
+        self.addRun(self.keysOf(self.ends[first:first + count]),
+                    np.arange(first, first + count))
+
+        # merging the last runs while the newest one is as big as the previous
+        while len(self.runs) > 1 and len(self.runs[-1][0]) >= len(self.runs[-2][0]):
+            newer, older = self.runs.pop(), self.runs.pop()
+            self.addRun(np.concatenate((older[0], newer[0])),
+                        np.concatenate((older[1], newer[1])))
+
+        return first
+
+
+    def addLines(self, lines):
+        """
+        Adds a list of Line objects (cf geometry.py) to the index and returns
+        the number of the first one.
+        """
+        a = np.array([(line.a.x, line.a.y) for line in lines], dtype = float).reshape(-1, 2)
+        b = np.array([(line.b.x, line.b.y) for line in lines], dtype = float).reshape(-1, 2)
+        return self.add((a, b))
+
+
+    def chord(self, number):
+        """
+        Returns the ends (ax, ay, bx, by) of the chord of the given number.
+        """
+        return tuple(self.ends[number].tolist())
+
+
+    def nearest(self, x, y, maxDistance = math.inf):
+        """
+        Returns the (number, distance) couple of the chord nearest to the point
+        (x, y), or None if there is no chord closer than maxDistance.
+        """
+        if self.box is None:
+            return None
+        xMin, yMin, xMax, yMax = self.box
+        # no chord is closer than the bounding box or the disk holding the chords,
+        # all are closer than the far corner of the box
+        closest = max(math.hypot(max(xMin - x, 0, x - xMax), max(yMin - y, 0, y - yMax)),
+                      math.hypot(x - self.origin[0], y - self.origin[1]) - self.reach)
+        farthest = math.hypot(max(x - xMin, xMax - x), max(y - yMin, yMax - y))
+        if closest > maxDistance:
+            return None
+        # the search radius goes beyond closest by an excess growing 4 times
+        excess = self.offsetWidth/2
+        radius = closest + excess
+        while True:
+            radius = min(radius, maxDistance, farthest)
+            candidates = self.chordsOfOffsets(*self.lensRanges(x, y, radius))
+            if len(candidates):
+                distances = segmentDistances(self.ends[candidates], x, y)
+                i = np.argmin(distances)
+                if distances[i] <= radius:
+                    return int(candidates[i]), float(distances[i])
+            if radius >= min(maxDistance, farthest):
+                return None
+            # the nearest chord is at most as far as the best candidate
+            excess *= 4
+            radius = min(distances[i], closest + excess) if len(candidates) else closest + excess
+
+
+    def through(self, xMin, yMin, xMax, yMax, limit = None):
+        """
+        Returns the array of the numbers of the chords crossing the rectangle
+        [xMin, xMax] x [yMin, yMax], or of limit of them if there are more.
+        With a limit, FIRST_BINS angle bins are searched first, then as many
+        as the chords found so far say are needed, in the order of spread (so
+        the chords found have all the angles).
+        """
+        if self.box is None or xMax < self.box[0] or yMax < self.box[1] \
+                or xMin > self.box[2] or yMin > self.box[3]:
+            return np.empty(0, dtype = np.int64)
+        low, high = self.offsetRanges([(xMin, yMin), (xMax, yMin),
+                                       (xMin, yMax), (xMax, yMax)])
+        parts, found = [], 0
+        start, size = 0, self.angles if limit is None else FIRST_BINS
+        while True:
+            bins = self.spread[start:start + size]
+            candidates = self.chordsOfOffsets(low[bins], high[bins], bins)
+            parts.append(candidates[segmentsCrossRectangle(self.ends[candidates],
+                                                           xMin, yMin, xMax, yMax)])
+            found += len(parts[-1])
+            start += size
+            if start >= self.angles or (limit is not None and found >= limit):
+                return np.concatenate(parts)[:limit]
+            # the bins expected to give the missing chords, with a margin
+            size = self.angles if not found else math.ceil(1.5*start*(limit - found)/found)
+
+
+    def highlight(self, numbers, color = "red", tag = "selection"):
+        """
+        Erases the previously highlighted chords and draws the given ones (at
+        most MAX_DRAWN of them) with the given color. Returns the tag of the
+        drawn objects.
+        """
+        efface(tag)
+        for ax, ay, bx, by in self.ends[np.asarray(numbers, dtype = np.int64)[:MAX_DRAWN]].tolist():
+            ligne(ax, ay, bx, by, couleur = color, epaisseur = 2, tag = tag)
+        return tag
+
+
+    def addRun(self, keys, numbers):
+        """
+        Sorts the given chords by key and adds them to the index as a new run.
+        """
+        order = np.argsort(keys, kind = "stable")
+        keys = keys[order]
+        # about one cell per chord, so the cell starts take as much room as the chords
+        offsets = max(1, -(-len(keys)//self.angles))
+        cells = np.arange(self.angles*offsets + 1)*(2*self.span/offsets)
+        self.runs.append((keys, numbers[order], offsets,
+                          np.searchsorted(keys, cells).astype(np.int64)))
+
+
+    def keysOf(self, ends):
+        """
+        Returns the sort keys of the given chords : their angle bin and offset,
+        packed in one number.
+        """
+        ax, ay, bx, by = (ends - np.tile(self.origin, 2)).T
+        normalX, normalY = ay - by, bx - ax
+        # normals are taken with an angle in [0, pi[
+        flip = (normalY < 0) | ((normalY == 0) & (normalX < 0))
+        normalX[flip], normalY[flip] = -normalX[flip], -normalY[flip]
+        lengths = np.hypot(normalX, normalY)
+        normalX[lengths == 0], lengths[lengths == 0] = 1, 1
+
+        bins = np.minimum(np.arctan2(normalY, normalX)//self.step, self.angles - 1)
+        offsets = (normalX*ax + normalY*ay)/lengths
+        return bins*(2*self.span) + (offsets + self.span)
+
+
+    def offsetRanges(self, points):
+        """
+        Returns the (low, high) arrays giving, in each angle bin, the range of
+        the projections of the given points on the normals of the bin.
+        """
+        points = np.asarray(points, dtype = float) - self.origin
+        projections = np.outer(self.cosines, points[:, 0]) + np.outer(self.sines, points[:, 1])
+        projections = np.minimum(projections[:-1], projections[1:]), \
+                      np.maximum(projections[:-1], projections[1:])
+        # the projection moves by at most |point| * step inside a bin
+        margin = np.hypot(points[:, 0], points[:, 1]).max()*self.step/2
+        return projections[0].min(axis = 1) - margin, projections[1].max(axis = 1) + margin
+
+
+    def lensRanges(self, x, y, radius):
+        """
+        Returns the (low, high) arrays giving, in each angle bin, the range of
+        the offsets of the lines crossing the part of the disk of center (x, y)
+        and of the given radius which is inside the disk holding the chords :
+        the chords closer than radius to (x, y) are among these lines.
+        """
+        p = np.array([x, y], dtype = float) - self.origin
+        distance, reach = math.hypot(*p), self.reach
+        normals = self.normals
+        if distance + radius <= reach or distance == 0:
+            # the disk of the point is inside the disk of the chords
+            projections = normals @ p
+            high, low = projections + radius, projections - radius
+            extent = distance + radius
+        elif distance + reach <= radius:
+            high, low = np.full(len(normals), reach), np.full(len(normals), -reach)
+            extent = reach
+        else:
+            # support function of the lens : the farthest of the points of the
+            # two circles in the direction of the normal (if they are in the
+            # lens) and of the 2 corners
+            along = (reach**2 - radius**2 + distance**2)/(2*distance)
+            side = math.sqrt(max(reach**2 - along**2, 0))
+            unit = p/distance
+            corners = np.array([along*unit + side*np.array([-unit[1], unit[0]]),
+                                along*unit - side*np.array([-unit[1], unit[0]])])
+            projections = normals @ p
+            supports = []
+            for sign in (1, -1):
+                # |p + radius*n| <= reach and |reach*n - p| <= radius, n being sign*normal
+                ofPoint = np.where(distance**2 + radius**2 + 2*radius*sign*projections <= reach**2,
+                                   sign*projections + radius, -math.inf)
+                ofChords = np.where(reach**2 + distance**2 - 2*reach*sign*projections <= radius**2,
+                                    reach, -math.inf)
+                ofCorners = sign*(normals @ corners.T)
+                supports.append(np.maximum(np.maximum(ofPoint, ofChords),
+                                           np.maximum(ofCorners[:, 0], ofCorners[:, 1])))
+            high, low = supports[0], -supports[1]
+            extent = min(distance + radius, reach)
+        # the support moves by at most extent * step inside a bin
+        margin = extent*self.step/2
+        return np.minimum(low[:-1], low[1:]) - margin, np.maximum(high[:-1], high[1:]) + margin
+
+
+    def chordsOfOffsets(self, low, high, bins = None):
+        """
+        Returns the numbers of the chords whose offset is between low and high
+        (arrays giving the bounds of each angle bin, or of the given bins).
+        """
+        bins = self.bins if bins is None else bins
+        low = np.minimum(np.maximum(low + self.span, 0), 2*self.span)
+        high = np.minimum(np.maximum(high + self.span, 0), 2*self.span)
+        # bounds of the keys of each angle bin
+        lowKeys = bins*(2*self.span) + low
+        highKeys = lowKeys + (high - low)
+        parts = []
+        for keys, numbers, offsets, cells in self.runs:
+            scale = offsets/(2*self.span)
+            base = bins*offsets
+            starts = cells[base + np.minimum((low*scale).astype(np.int64), offsets - 1)]
+            stops = cells[base + np.minimum((high*scale).astype(np.int64) + 1, offsets)]
+            counts = np.maximum(stops - starts, 0)
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) \
+                        + np.arange(counts.sum())
+            # the cells go beyond the bounds : the keys, read in order, are checked
+            found = keys[positions]
+            inside = (found >= np.repeat(lowKeys, counts)) & (found <= np.repeat(highKeys, counts))
+            parts.append(numbers[positions[inside]])
+        return np.concatenate(parts) if parts else np.empty(0, dtype = np.int64)
+
+
+### functions
+
+def segmentDistances(ends, x, y):
+    """
+    Returns the distances from the point (x, y) to the segments of the given
+    (count, 4) array of ends.
+    """
+    ax, ay, bx, by = ends.T
+    dx, dy = bx - ax, by - ay
+    squared = dx*dx + dy*dy
+    t = ((x - ax)*dx + (y - ay)*dy)/np.where(squared > 0, squared, 1)
+    t = np.clip(t, 0, 1)
+    return np.hypot(ax + t*dx - x, ay + t*dy - y)
+
+
+def segmentsCrossRectangle(ends, xMin, yMin, xMax, yMax):
+    """
+    Returns the boolean array telling which of the given segments cross the
+    rectangle [xMin, xMax] x [yMin, yMax] (Liang-Barsky clipping).
+    """
+    ax, ay, bx, by = ends.T
+    enter, leave = np.zeros(len(ends)), np.ones(len(ends))
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        for a, b, low, high in ((ax, bx, xMin, xMax), (ay, by, yMin, yMax)):
+            t0, t1 = (low - a)/(b - a), (high - a)/(b - a)
+            # segments parallel to the side give NaN or infinite parameters
+            inside = (a >= low) & (a <= high)
+            enter = np.fmax(enter, np.where(inside & (a == b), 0, np.minimum(t0, t1)))
+            leave = np.fmin(leave, np.where(inside & (a == b), 1, np.maximum(t0, t1)))
+    return enter <= leave
+
+
+### tests
+
+def pickingTest(n = 20000, batchSize = 1000):
+    ball = Ball(2, 300, (windowWidth/2, windowHeight/2))
+    stream = Stream()
+    index = ChordIndex()
+
+    cree_fenetre(windowWidth, windowHeight, evenements = ["ClicGauche", "Deplacement", "Touche"])
+    cercle(windowWidth/2, windowHeight/2, 300)
+    for first in range(0, n, batchSize):
+        chords = ball.randomChords(2, first, batchSize, stream)
+        index.add(chords)
+        for ax, ay, bx, by in np.hstack(chords).tolist():
+            ligne(ax, ay, bx, by, couleur = "grey77")
+        mise_a_jour()
+
+    while True:
+        ev = attend_ev()
+        if type_ev(ev) == "Quitte":
+            break
+        if type_ev(ev) == "ClicGauche":
+            start = time.perf_counter()
+            found = index.nearest(abscisse(ev), ordonnee(ev))
+            print("nearest :", found, time.perf_counter() - start, "s")
+            if found is not None:
+                index.highlight([found[0]])
+        elif type_ev(ev) == "Deplacement":
+            x, y = abscisse(ev), ordonnee(ev)
+            index.highlight(index.through(x - 2, y - 2, x + 2, y + 2, MAX_DRAWN), "blue", "hover")
+
+    ferme_fenetre()
+
+
+if __name__ == "__main__":
+    pickingTest()
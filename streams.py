@@ -0,0 +1,106 @@
+"""
+This module contains counter-based random streams : the k-th random number
+drawn for the i-th chord of a run only depends on the seed, i and k. The
+chords of a run can then be generated in any order, by any number of batches
+or processes, and still be bit-identical for the same seed.
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import math
+import secrets
+import numpy as np
+
+### global variables
+
+MASK  = 2**64 - 1
+GAMMA = 0x9E3779B97F4A7C15 # odd constant of the SplitMix64 generator
+MIX_1 = 0xBF58476D1CE4E5B9
+MIX_2 = 0x94D049BB133111EB
+
+### class
+
+class Stream:
+    """
+    This class is designed for a counter-based random stream, represented by
+    its seed and a key telling apart the streams of a same seed (e.g. the
+    method). The numbers are obtained by hashing (seed, key, chord index, draw
+    index) with the SplitMix64 finalizer.
+    """
+    def __init__(self, seed = None, key = 0):
+        self.seed = seed if seed is not None else secrets.randbits(64)
+        self.key = mix((mix(self.seed & MASK) + key*GAMMA) & MASK)
+
+
+    def __str__(self):
+        return "stream (seed " + str(self.seed) + ")"
+
+
+    def uniforms(self, first, count, draws, offset = 0, dtype = np.float64):
+        """
+        Returns the (count, draws) array of the uniform numbers of ]0, 1[ drawn
+        for the chords first to first + count - 1, starting at the draw of index
+        offset. In float32 they are the float64 ones rounded (so 1 may appear).
+        """
+        with np.errstate(over = "ignore"):
+            chords = np.arange(first, first + count, dtype = np.uint64)
+            rows = mixArray(chords*np.uint64(GAMMA) + np.uint64(self.key))
+            columns = np.arange(offset + 1, offset + draws + 1, dtype = np.uint64)*np.uint64(GAMMA)
+            bits = mixArray(rows[:, None] + columns[None, :])
+        return ((bits >> np.uint64(11)).astype(dtype) + dtype(0.5))*dtype(2.**-53)
+
+
+    def uniform(self, index, draw):
+        """
+        Returns the uniform number of ]0, 1[ of the given draw for the chord of
+        the given index (same value as uniforms, computed without NumPy).
+        """
+        row = mix((index*GAMMA + self.key) & MASK)
+        bits = mix((row + (draw + 1)*GAMMA) & MASK)
+        return ((bits >> 11) + 0.5)*2.**-53
+
+
+    def normals(self, first, count, dimension, offset = 0, dtype = np.float64):
+        """
+        Returns a (count, dimension) array of standard normal numbers, computed
+        with the Box-Muller transform from normalDraws(dimension) draws starting
+        at offset. They are computed in float64 and then rounded to the given
+        type : the transform is too sensitive to the rounding of the uniforms.
+        """
+        pairs = (dimension + 1)//2
+        u = self.uniforms(first, count, 2*pairs, offset)
+        radii = np.sqrt(-2*np.log(u[:, :pairs]))
+        angles = 2*math.pi*u[:, pairs:]
+        return np.concatenate((radii*np.cos(angles), radii*np.sin(angles)),
+                              axis = 1)[:, :dimension].astype(dtype, copy = False)
+
+
+### functions
+
+def mix(x):
+    """
+    Returns the SplitMix64 hash of the 64 bits integer x.
+    """
+    x = ((x ^ (x >> 30))*MIX_1) & MASK
+    x = ((x ^ (x >> 27))*MIX_2) & MASK
+    return x ^ (x >> 31)
+
+
+def mixArray(x):
+    """
+    Returns the SplitMix64 hash of each element of a uint64 array.
+    """
+    with np.errstate(over = "ignore"):
+        x = (x ^ (x >> np.uint64(30)))*np.uint64(MIX_1)
+        x = (x ^ (x >> np.uint64(27)))*np.uint64(MIX_2)
+    return x ^ (x >> np.uint64(31))
+
+
+def normalDraws(dimension):
+    """
+    Returns the number of draws used by Stream.normals for one chord.
+    """
+    return 2*((dimension + 1)//2)
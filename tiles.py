@@ -0,0 +1,237 @@
+"""
+This module contains a zoomable view of very large sets of chords : their
+density is accumulated in a grid, from which a pyramid of tiles of decreasing
+resolutions is computed. Only the visible tiles of the current zoom level are
+drawn, and their images are cached, so zooming and panning never draw the
+chords again.
+"""
+
+__author__    = "Lysandre Macke"
+__credits__   = ["Lysandre Macke"]
+__version__   = "0.0.0"
+__email__     = "lysandre.macke@edu.univ-eiffel.fr"
+
+import math
+import numpy as np
+from ball import *
+from upemtk import * #credits : Arnaud Carayol, Cyril Nicaud, Carine Pivoteau
+
+### global variables
+
+windowWidth  = 1000
+windowHeight = 1000
+TILE_SIZE    = 256 # width of the tiles, in pixels
+LEVELS       = 5   # number of zoom levels of the pyramid
+SAMPLES      = 8   # number of points of a chord accumulated in the grid
+GOLDEN       = (math.sqrt(5) - 1)/2
+PAN_KEYS     = {"Left": (-1, 0), "Right": (1, 0), "Up": (0, -1), "Down": (0, 1)}
+
+### class
+
+class DensityPyramid:
+    """
+    This class is designed for the density of a set of 2D chords in the square
+    of upper left corner (x, y) and of the given side. The finest level is a
+    grid of TILE_SIZE * 2^(levels - 1) pixels per side, and each coarser level
+    sums the 2 x 2 blocks of the next one, the level 0 being a single tile.
+    A chord is accumulated in the finest grid by samples points evenly spaced
+    along it (with an offset moving from a chord to the next one), each of them
+    weighing the length of the chord divided by samples : with many chords this
+    is the same density as drawing them, for a cost independent of the zoom.
+    """
+    def __init__(self, x, y, side, levels = LEVELS, samples = SAMPLES):
+        self.x, self.y = x, y
+        self.side = side
+        self.levels = levels
+        self.samples = samples
+        self.resolution = TILE_SIZE*2**(levels - 1)
+
+        self.grids = [None]*(levels - 1) + [np.zeros((self.resolution, self.resolution),
+                                                     dtype = np.float32)]
+        self.maxima = [0.]*levels
+        self.count = 0     # number of accumulated chords
+        self.dirty = False # coarser levels to compute again
+        self.tiles = {}    # cached tile images, by (level, column, row)
+
+
+    def __len__(self):
+        return self.count
+
+
+    def add(self, chords):
+        """
+        Accumulates a batch of chords (a couple (a, b) of (count, 2) arrays) in
+        the finest grid.
+        """
+        a, b = chords
+        scale = self.resolution/self.side
+        ax, ay = (a[:, 0] - self.x)*scale, (a[:, 1] - self.y)*scale
+        dx, dy = (b[:, 0] - self.x)*scale - ax, (b[:, 1] - self.y)*scale - ay
+        weights = (np.hypot(dx, dy)/self.samples).astype(np.float32)
+
+        offsets = (np.arange(self.count, self.count + len(a))*GOLDEN) % 1
+        grid = self.grids[-1].reshape(-1)
+        for sample in range(self.samples):
+            t = (sample + offsets)/self.samples
+            columns = (ax + t*dx).astype(np.int64)
+            rows = (ay + t*dy).astype(np.int64)
+            inside = (columns >= 0) & (columns < self.resolution) \
+                     & (rows >= 0) & (rows < self.resolution)
+            np.add.at(grid, rows[inside]*self.resolution + columns[inside], weights[inside])
+
+        self.count += len(a)
+        self.dirty = True
+
+
+    def update(self):
+        """
+        Computes the coarser levels again if chords have been added, and
+        forgets the cached tiles.
+        """
+        if not self.dirty:
+            return
+        for level in range(self.levels - 2, -1, -1):
+            finer = self.grids[level + 1]
+            half = len(finer)//2
+            self.grids[level] = finer.reshape(half, 2, half, 2).sum(axis = (1, 3))
+        # each level is displayed on a log scale up to its maximum
+        self.maxima = [float(grid.max()) for grid in self.grids]
+        self.tiles.clear()
+        self.dirty = False
+
+
+    def tile(self, level, column, row):
+        """
+        Returns the image (cf upemtk.cree_image) of the tile of the given level,
+        column and row, from the cache if possible.
+        """
+        self.update()
+        key = (level, column, row)
+        if key not in self.tiles:
+            values = self.grids[level][row*TILE_SIZE:(row + 1)*TILE_SIZE,
+                                       column*TILE_SIZE:(column + 1)*TILE_SIZE]
+            scale = 255/math.log1p(self.maxima[level]) if self.maxima[level] else 0
+            shades = (np.log1p(values)*scale).astype(np.uint8)
+            # white background, from blue to black for the dense places
+            pixels = np.stack((255 - shades, 255 - shades, 255 - shades//2), axis = 2)
+            self.tiles[key] = cree_image(TILE_SIZE, TILE_SIZE, pixels.tobytes())
+        return self.tiles[key]
+
+
+class PyramidView:
+    """
+    This class is designed for a view of a DensityPyramid in the upemtk window,
+    represented by its zoom level and the point of the pyramid square (in its
+    own coordinates) shown at the center of the window.
+    """
+    def __init__(self, pyramid, width = windowWidth, height = windowHeight):
+        self.pyramid = pyramid
+        self.width, self.height = width, height
+        # biggest level showing the whole square
+        fit = math.floor(math.log2(min(width, height)/TILE_SIZE))
+        self.level = min(max(fit, 0), pyramid.levels - 1)
+        self.centerX = pyramid.x + pyramid.side/2
+        self.centerY = pyramid.y + pyramid.side/2
+
+
+    def scale(self):
+        """
+        Returns the number of pixels per unit of length at the current level.
+        """
+        return TILE_SIZE*2**self.level/self.pyramid.side
+
+
+    def draw(self):
+        """
+        Draws the visible tiles of the current level. Returns the number of
+        drawn tiles.
+        """
+        efface("tuiles")
+        scale = self.scale()
+        # position, in pixels of the level, of the upper left corner of the window
+        left = (self.centerX - self.pyramid.x)*scale - self.width/2
+        top = (self.centerY - self.pyramid.y)*scale - self.height/2
+        tiles = 2**self.level
+        drawn = 0
+        for row in range(max(0, math.floor(top/TILE_SIZE)),
+                         min(tiles, math.ceil((top + self.height)/TILE_SIZE))):
+            for column in range(max(0, math.floor(left/TILE_SIZE)),
+                                min(tiles, math.ceil((left + self.width)/TILE_SIZE))):
+                image(column*TILE_SIZE - left, row*TILE_SIZE - top,
+                      self.pyramid.tile(self.level, column, row), ancrage = "nw", tag = "tuiles")
+                drawn += 1
+        mise_a_jour()
+        return drawn
+
+
+    def zoom(self, levels, x = None, y = None):
+        """
+        Zooms in (levels > 0) or out (levels < 0), keeping the point of the
+        window (x, y) (its center by default) at the same place.
+        """
+        x = self.width/2 if x is None else x
+        y = self.height/2 if y is None else y
+        level = min(max(self.level + levels, 0), self.pyramid.levels - 1)
+        # the point under (x, y) stays under (x, y)
+        pointX = self.centerX + (x - self.width/2)/self.scale()
+        pointY = self.centerY + (y - self.height/2)/self.scale()
+        self.level = level
+        self.centerX = pointX - (x - self.width/2)/self.scale()
+        self.centerY = pointY - (y - self.height/2)/self.scale()
+
+
+    def pan(self, dx, dy):
+        """
+        Moves the view by (dx, dy) pixels.
+        """
+        self.centerX += dx/self.scale()
+        self.centerY += dy/self.scale()
+
+
+    def handle(self, ev):
+        """
+        Zooms or pans according to an upemtk event : left click zooms in and
+        right click zooms out around the mouse, + and - zoom, arrows pan.
+        Returns true if the view has changed (and has been drawn again).
+        """
+        kind = type_ev(ev)
+        if kind == "ClicGauche":
+            self.zoom(1, abscisse(ev), ordonnee(ev))
+        elif kind == "ClicDroit":
+            self.zoom(-1, abscisse(ev), ordonnee(ev))
+        elif kind == "Touche" and touche(ev) in ("plus", "KP_Add", "equal"):
+            self.zoom(1)
+        elif kind == "Touche" and touche(ev) in ("minus", "KP_Subtract"):
+            self.zoom(-1)
+        elif kind == "Touche" and touche(ev) in PAN_KEYS:
+            dx, dy = PAN_KEYS[touche(ev)]
+            self.pan(dx*self.width/4, dy*self.height/4)
+        else:
+            return False
+        self.draw()
+        return True
+
+
+### tests
+
+def tilesTest(n = 10**7, method = 1):
+    radius = 300
+    ball = Ball(2, radius, (windowWidth/2, windowHeight/2))
+    pyramid = DensityPyramid(windowWidth/2 - radius, windowHeight/2 - radius, 2*radius)
+    stream = Stream()
+    for first in range(0, n, 2**16):
+        pyramid.add(ball.randomChords(method, first, min(2**16, n - first), stream))
+
+    cree_fenetre(windowWidth, windowHeight)
+    view = PyramidView(pyramid)
+    view.draw()
+    while True:
+        ev = attend_ev()
+        if type_ev(ev) == "Quitte":
+            break
+        view.handle(ev)
+    ferme_fenetre()
+
+
+if __name__ == "__main__":
+    tilesTest()
@@ -26,14 +26,20 @@ __all__ = [
     'cercle',
     'point',
     'image',
+    'cree_image',
     'texte',
     'taille_texte',
     # effacer
     'efface_tout',
     'efface',
+    # calques
+    'calque',
+    'calque_statique',
+    'efface_calque',
     # utilitaires
     'attente',
     'capture_ecran',
+    'nombre_objets',
     'touche_pressee',
     'abscisse_souris',
     'ordonnee_souris',
@@ -42,6 +48,13 @@ __all__ = [
     'attend_ev',
     'attend_clic_gauche',
     'attend_fermeture',
+    'ecoute_ev',
+    'ignore_ev',
+    'programme',
+    'annule',
+    'prochain_ev',
+    'delai',
+    'lance',
     'type_ev',
     'abscisse',
     'ordonnee',
@@ -86,6 +99,9 @@ class CustomCanvas:
 
         # binding events
         self.ev_queue = deque()
+        self.callbacks = []       # functions called at each event
+        self.ev_tasks = deque()   # tasks awaiting the next event
+        self.waiting = False      # True while wait_event waits in the mainloop
         self.pressed_keys = set()
         self.events = CustomCanvas._default_ev if events is None else events
         self.bind_events()
@@ -93,6 +109,11 @@ class CustomCanvas:
         # marque
         self.tailleMarque = 5
 
+        # calques (étiquettes), du plus bas au plus haut, avec l'objet caché
+        # marquant le haut de chacun, et calque courant
+        self.calques = {}
+        self.calque = None
+
         # update for the first time
         self.last_update = time()
         self.root.update()
@@ -107,6 +128,35 @@ class CustomCanvas:
         sleep(max(0., self.interval - (t - self.last_update)))
         self.last_update = time()
 
+    def push_event(self, ev):
+        # the callbacks returning True consume the event
+        for callback in list(self.callbacks):
+            if callback(ev):
+                return
+        self.ev_queue.append(ev)
+        if self.ev_tasks:
+            self.root.after_idle(self.ev_tasks.popleft().resume,
+                                 self.ev_queue.popleft())
+        elif self.waiting:
+            self.root.quit()
+
+    def wait_event(self):
+        # Tk's event loop sleeps until an event comes, then push_event quits it
+        while not self.ev_queue:
+            self.waiting = True
+            try:
+                self.root.mainloop()
+            finally:
+                self.waiting = False
+        return self.ev_queue.popleft()
+
+    def wait(self, seconds):
+        end = time() + seconds
+        while time() < end:
+            timer = self.root.after(max(1, round((end - time())*1000)), self.root.quit)
+            self.root.mainloop()
+            self.root.after_cancel(timer)
+
     def bind_events(self):
         self.root.protocol("WM_DELETE_WINDOW", self.event_quit)
         self.canvas.bind('<KeyPress>', self.register_key)
@@ -122,13 +172,13 @@ class CustomCanvas:
             self.pressed_keys.remove(ev.keysym)
 
     def event_quit(self):
-        self.ev_queue.append(("Quitte", ""))
+        self.push_event(("Quitte", ""))
 
     def bind_event(self, name):
         e_type = CustomCanvas._ev_mapping.get(name, name)
 
         def handler(event, _name=name):
-            self.ev_queue.append((_name, event))
+            self.push_event((_name, event))
         self.canvas.bind(e_type, handler, '+')
 
     def unbind_event(self, name):
@@ -136,6 +186,60 @@ class CustomCanvas:
         self.canvas.unbind(e_type)
 
 
+class Task:
+    """
+    Coroutine run by Tk's event loop (see ``lance``) : it is resumed when the
+    event or the delay it awaits (see ``prochain_ev`` and ``delai``) comes.
+    """
+
+    def __init__(self, canvas, coroutine):
+        self.canvas = canvas
+        self.coroutine = coroutine
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def resume(self, value=None):
+        # called by Tk : an exception would be lost and the task never done
+        try:
+            awaited = self.coroutine.send(value)
+            if not isinstance(awaited, (NextEvent, Delay)):
+                self.coroutine.close()
+                raise TypeError(
+                    "Seuls prochain_ev() et delai() peuvent être attendus "
+                    "par une coroutine exécutée par lance (attendu : "
+                    + repr(awaited) + ").")
+            awaited.schedule(self)
+            return
+        except StopIteration as stop:
+            self.done, self.result = True, stop.value
+        except BaseException as error:
+            self.done, self.error = True, error
+        self.canvas.root.quit()
+
+
+class NextEvent:
+    def __await__(self):
+        return (yield self)
+
+    def schedule(self, task):
+        if task.canvas.ev_queue:
+            task.canvas.root.after_idle(task.resume, task.canvas.ev_queue.popleft())
+        else:
+            task.canvas.ev_tasks.append(task)
+
+
+class Delay:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __await__(self):
+        return (yield self)
+
+    def schedule(self, task):
+        task.canvas.root.after(max(0, round(self.seconds*1000)), task.resume)
+
+
 __canevas = None
 __img = dict()
 
@@ -162,16 +266,19 @@ class FenetreDejaCree(Exception):
 #############################################################################
 
 
-def cree_fenetre(largeur, hauteur, frequence=100):
+def cree_fenetre(largeur, hauteur, frequence=100, evenements=None):
     """
     Crée une fenêtre de dimensions ``largeur`` x ``hauteur`` pixels.
+    Les types d'événements à écouter peuvent être donnés dans ``evenements``
+    (par défaut 'ClicGauche', 'ClicDroit' et 'Touche', on peut ajouter par
+    exemple 'Deplacement').
     :rtype:
     """
     global __canevas
     if __canevas is not None:
         raise FenetreDejaCree(
             'La fenêtre a déjà été crée avec la fonction "cree_fenetre".')
-    __canevas = CustomCanvas(largeur, hauteur, frequence)
+    __canevas = CustomCanvas(largeur, hauteur, frequence, evenements)
 
 
 def ferme_fenetre():
@@ -217,11 +324,11 @@ def ligne(ax, ay, bx, by, couleur='black', epaisseur=1, tag=''):
     :param str tag: étiquette d'objet (défaut : pas d'étiquette)
     :return: identificateur d'objet
     """
-    return __canevas.canvas.create_line(
+    return __dans_calque(__canevas.canvas.create_line(
         ax, ay, bx, by,
         fill=couleur,
         width=epaisseur,
-        tag=tag)
+        tag=tag))
 
 
 def fleche(ax, ay, bx, by, couleur='black', epaisseur=1, tag=''):
@@ -241,12 +348,12 @@ def fleche(ax, ay, bx, by, couleur='black', epaisseur=1, tag=''):
     n = (x**2 + y**2)**.5
     x, y = x/n, y/n    
     points = [bx, by, bx-x*5-2*y, by-5*y+2*x, bx-x*5+2*y, by-5*y-2*x]
-    return __canevas.canvas.create_polygon(
+    return __dans_calque(__canevas.canvas.create_polygon(
         points, 
         fill=couleur, 
         outline=couleur,
         width=epaisseur,
-        tag=tag)
+        tag=tag))
 
 
 def polygone(points, couleur='black', remplissage='', epaisseur=1, tag=''):
@@ -260,12 +367,12 @@ def polygone(points, couleur='black', remplissage='', epaisseur=1, tag=''):
     :param str tag: étiquette d'objet (défaut : pas d'étiquette)
     :return: identificateur d'objet
     """
-    return __canevas.canvas.create_polygon(
+    return __dans_calque(__canevas.canvas.create_polygon(
         points, 
         fill=remplissage, 
         outline=couleur,
         width=epaisseur,
-        tag=tag)
+        tag=tag))
 
 
 def rectangle(ax, ay, bx, by,
@@ -284,12 +391,12 @@ def rectangle(ax, ay, bx, by,
     :param str tag: étiquette d'objet (défaut : pas d'étiquette)
     :return: identificateur d'objet
     """
-    return __canevas.canvas.create_rectangle(
+    return __dans_calque(__canevas.canvas.create_rectangle(
         ax, ay, bx, by,
         outline=couleur,
         fill=remplissage,
         width=epaisseur,
-        tag=tag)
+        tag=tag))
 
 
 def cercle(x, y, r, couleur='black', remplissage='', epaisseur=1, tag=''):
@@ -305,12 +412,12 @@ def cercle(x, y, r, couleur='black', remplissage='', epaisseur=1, tag=''):
     :param str tag: étiquette d'objet (défaut : pas d'étiquette)
     :return: identificateur d'objet
     """
-    return __canevas.canvas.create_oval(
+    return __dans_calque(__canevas.canvas.create_oval(
         x - r, y - r, x + r, y + r,
         outline=couleur,
         fill=remplissage,
         width=epaisseur,
-        tag=tag)
+        tag=tag))
 
 
 def arc(x, y, r, ouverture=90, depart=0, couleur='black', remplissage='',
@@ -332,7 +439,7 @@ def arc(x, y, r, ouverture=90, depart=0, couleur='black', remplissage='',
     :param str tag: étiquette d'objet (défaut : pas d'étiquette)
     :return: identificateur d'objet
     """
-    return __canevas.canvas.create_arc(
+    return __dans_calque(__canevas.canvas.create_arc(
         x - r, y - r, x + r, y + r,
         extent=ouverture,
         start=depart,
@@ -340,7 +447,7 @@ def arc(x, y, r, ouverture=90, depart=0, couleur='black', remplissage='',
         outline=couleur,
         fill=remplissage,
         width=epaisseur,
-        tag=tag)
+        tag=tag))
 
 
 def point(x, y, couleur='black', epaisseur=1, tag=''):
@@ -366,15 +473,18 @@ def image(x, y, fichier, ancrage='center', tag=''):
     """
     Affiche l'image contenue dans ``fichier`` avec ``(x, y)`` comme centre. Les
     valeurs possibles du point d'ancrage sont ``'center'``, ``'nw'``, etc.
+    ``fichier`` peut aussi être une image créée par ``cree_image``.
 
     :param float x: abscisse du point d'ancrage
     :param float y: ordonnée du point d'ancrage
-    :param str fichier: nom du fichier contenant l'image
+    :param str fichier: nom du fichier contenant l'image, ou image
     :param ancrage: position du point d'ancrage par rapport à l'image
     :param str tag: étiquette d'objet (défaut : pas d'étiquette)
     :return: identificateur d'objet
     """
-    if PIL_AVAILABLE:
+    if isinstance(fichier, tk.PhotoImage):
+        tkimage = fichier
+    elif PIL_AVAILABLE:
         img = Image.open(fichier)
         tkimage = ImageTk.PhotoImage(img)
     else:
@@ -382,7 +492,22 @@ def image(x, y, fichier, ancrage='center', tag=''):
     img_object = __canevas.canvas.create_image(
         x, y, anchor=ancrage, image=tkimage, tag=tag)
     __img[img_object] = tkimage
-    return img_object
+    return __dans_calque(img_object)
+
+
+def cree_image(largeur, hauteur, pixels):
+    """
+    Crée une image en mémoire, à afficher avec ``image`` autant de fois que
+    voulu sans la relire.
+
+    :param int largeur: largeur de l'image en pixels
+    :param int hauteur: hauteur de l'image en pixels
+    :param bytes pixels: composantes rouge, verte et bleue (un octet chacune)
+        des pixels, ligne par ligne
+    :return: image
+    """
+    entete = ('P6 %d %d 255 ' % (largeur, hauteur)).encode()
+    return tk.PhotoImage(data=entete + pixels, format='PPM')
 
 
 # Texte
@@ -404,10 +529,10 @@ def texte(x, y, chaine,
     :return: identificateur d'objet
     """
 
-    return __canevas.canvas.create_text(
+    return __dans_calque(__canevas.canvas.create_text(
         x, y,
         text=chaine, font=(police, taille), tag=tag,
-        fill=couleur, anchor=ancrage)
+        fill=couleur, anchor=ancrage))
 
 
 def taille_texte(chaine, police='Helvetica', taille='24'):
@@ -435,6 +560,9 @@ def efface_tout():
     """
     __img.clear()
     __canevas.canvas.delete("all")
+    # les calques restent empilés dans le même ordre
+    for nom in __canevas.calques:
+        __canevas.calques[nom] = __sentinelle()
 
 
 def efface(objet):
@@ -444,20 +572,104 @@ def efface(objet):
     :param: objet ou étiquette d'objet à supprimer
     :type: ``int`` ou ``str``
     """
-    if objet in __img:
-        del __img[objet]
+    if objet == "all": # les objets cachés des calques sont gardés
+        return efface_tout()
+    # les images des objets de l'étiquette ne sont plus gardées
+    for numero in __canevas.canvas.find_withtag(objet):
+        __img.pop(numero, None)
     __canevas.canvas.delete(objet)
 
 
+#############################################################################
+# Calques
+#############################################################################
+
+def calque(nom):
+    """
+    Dessine les objets suivants dans le calque ``nom`` (dans aucun calque si
+    ``nom`` vaut ``None``). Les calques sont empilés dans l'ordre de leur
+    premier usage : les objets d'un calque restent sous ceux des suivants.
+
+    :param str nom: nom du calque, qui sert aussi d'étiquette à ses objets
+    """
+    if __canevas is None:
+        raise FenetreNonCree(
+            "La fenêtre n'a pas été crée avec la fonction \"cree_fenetre\".")
+    if nom is not None and nom not in __canevas.calques:
+        __canevas.calques[nom] = __sentinelle()
+    __canevas.calque = nom
+
+
+def calque_statique(nom, dessin):
+    """
+    Dessine le calque ``nom`` en appelant ``dessin()``, s'il ne l'est pas
+    déjà. Un fond (cercle, légende...) n'est ainsi dessiné qu'une fois, et
+    reste affiché quand les autres calques sont effacés.
+
+    :param str nom: nom du calque
+    :param dessin: fonction sans paramètre dessinant le calque
+    :return: ``True`` si le calque a été dessiné
+    """
+    if __canevas is None:
+        raise FenetreNonCree(
+            "La fenêtre n'a pas été crée avec la fonction \"cree_fenetre\".")
+    if __canevas.canvas.find_withtag(nom):
+        return False
+    precedent = __canevas.calque
+    calque(nom)
+    try:
+        dessin()
+    finally:
+        __canevas.calque = precedent
+    return True
+
+
+def efface_calque(nom):
+    """
+    Efface les objets du calque ``nom``, sans toucher aux autres calques.
+
+    :param str nom: nom du calque
+    """
+    if __canevas is None:
+        raise FenetreNonCree(
+            "La fenêtre n'a pas été crée avec la fonction \"cree_fenetre\".")
+    for objet in __canevas.canvas.find_withtag(nom):
+        __img.pop(objet, None)
+    __canevas.canvas.delete(nom)
+
+
+def __dans_calque(objet):
+    """
+    Ajoute ``objet`` au calque courant, sous les objets des calques suivants.
+    """
+    nom = __canevas.calque
+    if nom is not None:
+        __canevas.canvas.addtag_withtag(nom, objet)
+        # juste sous l'objet caché du haut du calque : en O(1), quel que soit
+        # le nombre d'objets des calques suivants
+        __canevas.canvas.tag_lower(objet, __canevas.calques[nom])
+    return objet
+
+
+def __sentinelle():
+    """
+    Crée l'objet caché marquant le haut d'un nouveau calque, au-dessus de
+    tous les objets.
+    """
+    return __canevas.canvas.create_line(0, 0, 0, 0, state='hidden')
+
+
 #############################################################################
 # Utilitaires
 #############################################################################
 
 
 def attente(temps):
-    start = time()
-    while time() - start < temps:
-        mise_a_jour()
+    """
+    Attend ``temps`` secondes dans la boucle d'événements de Tk : la fenêtre
+    reste à jour et les événements sont mis dans la file.
+    """
+    __canevas.wait(temps)
 
 
 def capture_ecran(file):
@@ -473,6 +685,16 @@ def capture_ecran(file):
     subprocess.call("rm " + file + ".ps", shell=True)
 
 
+def nombre_objets():
+    """
+    Renvoie le nombre d'objets dessinés dans la fenêtre.
+    """
+    if __canevas is None:
+        raise FenetreNonCree(
+            "La fenêtre n'a pas été crée avec la fonction \"cree_fenetre\".")
+    return len(__canevas.canvas.find_all()) - len(__canevas.calques)
+
+
 def touche_pressee(keysym):
     """
     Renvoie `True` si ``keysym`` est actuellement pressée.
@@ -502,12 +724,12 @@ def donne_ev():
 
 def attend_ev():
     """Attend qu'un événement ait lieu et renvoie le premier événement qui
-    se produit."""
-    while True:
-        ev = donne_ev()
-        if ev is not None:
-            return ev
-        mise_a_jour()
+    se produit. L'attente se fait dans la boucle d'événements de Tk, sans
+    consommer de processeur."""
+    if __canevas is None:
+        raise FenetreNonCree(
+            "La fenêtre n'a pas été créée avec la fonction \"cree_fenetre\".")
+    return __canevas.wait_event()
 
 
 def attend_clic_gauche():
@@ -515,21 +737,91 @@ def attend_clic_gauche():
     coordonnées. **Attention**, cette fonction empêche la détection d'autres
     événements ou la fermeture de la fenêtre."""
     while True:
-        ev = donne_ev()
-        if ev is not None and type_ev(ev) == 'ClicGauche':
+        ev = attend_ev()
+        if type_ev(ev) == 'ClicGauche':
             return abscisse(ev), ordonnee(ev)
-        mise_a_jour()
 
 
 def attend_fermeture():
     """Attend la fermeture de la fenêtre. Cette fonction renvoie None.
     **Attention**, cette fonction empêche la détection d'autres événements."""
     while True:
-        ev = donne_ev()
-        if ev is not None and type_ev(ev) == 'Quitte':
+        ev = attend_ev()
+        if type_ev(ev) == 'Quitte':
             ferme_fenetre()
             return
-        mise_a_jour()
+
+
+def ecoute_ev(fonction):
+    """
+    Appelle ``fonction(ev)`` à chaque événement, dès qu'il a lieu (pendant
+    une attente ou un appel à ``mise_a_jour``). Si elle renvoie ``True``,
+    l'événement est traité et n'est pas ajouté à la file des événements.
+
+    :param fonction: fonction prenant un événement
+    :return: ``fonction``
+    """
+    __canevas.callbacks.append(fonction)
+    return fonction
+
+
+def ignore_ev(fonction):
+    """
+    N'appelle plus ``fonction`` à chaque événement (voir ``ecoute_ev``).
+    """
+    if fonction in __canevas.callbacks:
+        __canevas.callbacks.remove(fonction)
+
+
+def programme(temps, fonction, *arguments):
+    """
+    Appelle ``fonction(*arguments)`` dans ``temps`` secondes, depuis la
+    boucle d'événements de Tk.
+
+    :return: identifiant à donner à ``annule``
+    """
+    return __canevas.root.after(max(0, round(temps*1000)), fonction, *arguments)
+
+
+def annule(identifiant):
+    """
+    Annule un appel programmé avec ``programme``.
+    """
+    __canevas.root.after_cancel(identifiant)
+
+
+def prochain_ev():
+    """
+    Renvoie un objet à attendre avec ``await`` dans une coroutine exécutée
+    par ``lance`` : ``ev = await prochain_ev()`` donne le prochain événement.
+    """
+    return NextEvent()
+
+
+def delai(temps):
+    """
+    Renvoie un objet à attendre avec ``await`` dans une coroutine exécutée
+    par ``lance`` : ``await delai(temps)`` reprend dans ``temps`` secondes.
+    """
+    return Delay(temps)
+
+
+def lance(coroutine):
+    """
+    Exécute la coroutine ``coroutine`` (``async def``) dans la boucle
+    d'événements de Tk, qui la reprend dès que l'événement ou le délai
+    qu'elle attend arrive, et renvoie son résultat.
+    """
+    if __canevas is None:
+        raise FenetreNonCree(
+            "La fenêtre n'a pas été créée avec la fonction \"cree_fenetre\".")
+    tache = Task(__canevas, coroutine)
+    __canevas.root.after_idle(tache.resume)
+    while not tache.done:
+        __canevas.root.mainloop()
+    if tache.error is not None:
+        raise tache.error
+    return tache.result
 
 
 def type_ev(ev):
@@ -582,3 +874,92 @@ def abscisse_souris():
 
 def ordonnee_souris():
     return __canevas.canvas.winfo_pointery() - __canevas.canvas.winfo_rooty()
+
+
+#############################################################################
+# Tests
+#############################################################################
+
+
+class _RacineFactice:
+    """
+    Boucle d'événements factice (``after``, ``after_idle``, ``quit``,
+    ``mainloop``) où le temps avance d'un appel programmé au suivant.
+    """
+
+    def __init__(self):
+        self.maintenant = 0
+        self.appels = []  # (instant, numéro, fonction, arguments)
+        self.quitte = False
+
+    def after(self, ms, fonction, *arguments):
+        self.appels.append((self.maintenant + ms, len(self.appels), fonction,
+                            arguments))
+        self.appels.sort(key=lambda appel: appel[:2])
+
+    def after_idle(self, fonction, *arguments):
+        self.after(0, fonction, *arguments)
+
+    def quit(self):
+        self.quitte = True
+
+    def mainloop(self):
+        self.quitte = False
+        while self.appels and not self.quitte:
+            self.maintenant, _, fonction, arguments = self.appels.pop(0)
+            fonction(*arguments)
+        assert self.quitte, "boucle vide avant la fin de la tâche"
+
+
+class _CanevasFactice:
+    push_event = CustomCanvas.push_event
+
+    def __init__(self):
+        self.root = _RacineFactice()
+        self.ev_queue = deque()
+        self.ev_tasks = deque()
+        self.callbacks = []
+        self.waiting = False
+
+
+def _execute(canevas, coroutine):
+    # comme lance, sur un canevas factice
+    tache = Task(canevas, coroutine)
+    canevas.root.after_idle(tache.resume)
+    while not tache.done:
+        canevas.root.mainloop()
+    return tache
+
+
+def test_taches():
+    import asyncio
+    canevas = _CanevasFactice()
+
+    async def attend():
+        premier = await prochain_ev()   # déjà dans la file
+        await delai(0.5)
+        second = await prochain_ev()    # arrive pendant l'attente
+        return premier, second, canevas.root.maintenant
+
+    canevas.push_event(('Touche', 'a'))
+    canevas.root.after(1000, canevas.push_event, ('Touche', 'b'))
+    tache = _execute(canevas, attend())
+    assert tache.result == (('Touche', 'a'), ('Touche', 'b'), 1000), tache.result
+
+    async def leve():
+        await delai(0)
+        raise ValueError("erreur de la coroutine")
+
+    tache = _execute(canevas, leve())
+    assert isinstance(tache.error, ValueError), tache.error
+
+    async def attend_asyncio():
+        await asyncio.sleep(0)  # ni prochain_ev ni delai
+
+    tache = _execute(canevas, attend_asyncio())
+    assert isinstance(tache.error, TypeError), tache.error
+    print("Tâches : tests réussis.")
+
+
+if __name__ == "__main__":
+    test_taches()